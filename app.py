@@ -4,14 +4,39 @@ Entry point for the application.
 """
 
 import os
+import orjson
 from dotenv import load_dotenv
 from flask import Flask, send_from_directory
+from flask.json.provider import JSONProvider
 from flask_cors import CORS
 
 # Load environment variables
 load_dotenv()
 
 
+class OrjsonProvider(JSONProvider):
+    """Flask JSON provider backed by orjson for faster response encoding."""
+    
+    # Allow numpy arrays/scalars and non-string dict keys in responses
+    options = orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS
+    
+    def dumps(self, obj, **kwargs):
+        """Serialize obj to a JSON string."""
+        return orjson.dumps(obj, option=self.options).decode('utf-8')
+    
+    def loads(self, s, **kwargs):
+        """Deserialize a JSON string or bytes."""
+        return orjson.loads(s)
+    
+    def response(self, *args, **kwargs):
+        """Build a JSON response without an intermediate str round-trip."""
+        obj = self._prepare_response_obj(args, kwargs)
+        return self._app.response_class(
+            orjson.dumps(obj, option=self.options | orjson.OPT_APPEND_NEWLINE),
+            mimetype='application/json'
+        )
+
+
 def create_app():
     """
     Application factory for creating and configuring the Flask app.
@@ -20,12 +45,41 @@ def create_app():
         Flask: Configured Flask application instance
     """
     app = Flask(__name__)
+    app.json = OrjsonProvider(app)
     
     # Configuration
     app.config['MAX_CONTENT_LENGTH'] = 50 * 1024 * 1024  # 50MB max file size
     app.config['UPLOAD_FOLDER'] = os.getenv('UPLOAD_FOLDER', 'uploads')
     app.config['DATABASE'] = os.getenv('DATABASE_PATH', 'data/cv.db')
     app.config['FAISS_INDEX_PATH'] = os.getenv('FAISS_INDEX_PATH', 'data/faiss.index')
+    # FAISS index type, e.g. "HNSW32,SQfp16" (HNSW over float16 vectors), "HNSW32",
+    # "Flat", "SQ8" (int8) or "PQ64x4fs" (PQ FastScan)
+    app.config['FAISS_INDEX_FACTORY'] = os.getenv('FAISS_INDEX_FACTORY', 'HNSW32,SQfp16')
+    app.config['FAISS_TRAIN_SIZE'] = int(os.getenv('FAISS_TRAIN_SIZE', 1000))
+    # HNSW search breadth (recall vs. latency)
+    app.config['FAISS_HNSW_EF_SEARCH'] = int(os.getenv('FAISS_HNSW_EF_SEARCH', 64))
+    # Compressed IVF-PQ index used once the corpus is large (empty disables it)
+    app.config['FAISS_LARGE_INDEX_FACTORY'] = os.getenv('FAISS_LARGE_INDEX_FACTORY', 'IVF1024,PQ48x8')
+    app.config['FAISS_LARGE_INDEX_SIZE'] = int(os.getenv('FAISS_LARGE_INDEX_SIZE', 10000))
+    app.config['FAISS_IVF_NPROBE'] = int(os.getenv('FAISS_IVF_NPROBE', 16))
+    # Memoized FAISS search results per query vector (LRU + TTL, 0 disables)
+    app.config['FAISS_SEARCH_CACHE_SIZE'] = int(os.getenv('FAISS_SEARCH_CACHE_SIZE', 2000))
+    app.config['FAISS_SEARCH_CACHE_TTL'] = float(os.getenv('FAISS_SEARCH_CACHE_TTL', 300))
+    # Memory-map the index file instead of reading it into RAM
+    app.config['FAISS_MMAP'] = os.getenv('FAISS_MMAP', 'true').lower() == 'true'
+    # Optional GPU search backend: "faiss" (faiss-gpu) or "cagra" (cuVS), both need CUDA
+    app.config['FAISS_GPU_BACKEND'] = os.getenv('FAISS_GPU_BACKEND', 'none').lower()
+    app.config['FAISS_GPU_MIN_VECTORS'] = int(os.getenv('FAISS_GPU_MIN_VECTORS', 10000))
+    # Index changes are saved in the background every N seconds or M uploads
+    app.config['FAISS_SAVE_INTERVAL'] = float(os.getenv('FAISS_SAVE_INTERVAL', 5))
+    app.config['FAISS_SAVE_EVERY'] = int(os.getenv('FAISS_SAVE_EVERY', 20))
+    # Response cache for near-duplicate questions (cosine similarity threshold)
+    app.config['SEMANTIC_CACHE_SIZE'] = int(os.getenv('SEMANTIC_CACHE_SIZE', 10000))
+    app.config['SEMANTIC_CACHE_THRESHOLD'] = float(os.getenv('SEMANTIC_CACHE_THRESHOLD', 0.97))
+    # LSH signature bits for the /search cache fast path (0 disables it)
+    app.config['SEARCH_CACHE_LSH_BITS'] = int(os.getenv('SEARCH_CACHE_LSH_BITS', 12))
+    # Seconds a cached LLM parse of a CV text stays valid (0 = forever)
+    app.config['PARSE_CACHE_TTL'] = int(os.getenv('PARSE_CACHE_TTL', 7 * 24 * 3600))
     
     # Create upload folder if it doesn't exist
     os.makedirs(app.config['UPLOAD_FOLDER'], exist_ok=True)
@@ -34,6 +88,10 @@ def create_app():
     # Enable CORS
     CORS(app)
     
+    # Create shared service instances
+    from services import registry
+    registry.init_app(app)
+    
     # Register blueprints
     from routes.upload import upload_bp
     from routes.query import query_bp
@@ -2,11 +2,12 @@
 Query routes for RAG-based question answering on CV data.
 """
 
-from flask import Blueprint, request, jsonify, current_app
-from services.sqlite_repo import SQLiteRepository
-from services.faiss_index import FAISSIndex
-from services.embedding import EmbeddingService
-from services.query_agent import QueryAgent
+from flask import Blueprint, Response, request, jsonify, current_app, stream_with_context
+from services.registry import (
+    get_db_repo, get_faiss_index, get_search_index, get_embedding_service, get_query_agent,
+    get_query_cache, get_search_cache
+)
+from services.faiss_index import stack_embeddings
 
 query_bp = Blueprint('query', __name__)
 
@@ -20,11 +21,13 @@ def query_candidates():
     {
         "question": "Who has experience with Python?",
         "candidate_id": "optional-uuid-to-scope-search",
-        "top_k": 5
+        "top_k": 5,
+        "extract_filters": false,
+        "strict": false
     }
     
     Returns:
-        JSON with answer and retrieved context
+        JSON with answer and retrieved context (and extracted filters if requested)
     """
     try:
         # Validate request
@@ -35,29 +38,42 @@ def query_candidates():
         question = data['question']
         candidate_id = data.get('candidate_id')
         top_k = data.get('top_k', 10)  # Increased default from 5 to 10 for more comprehensive results
+        with_filters = bool(data.get('extract_filters'))
+        strict = bool(data.get('strict'))
         
-        # Initialize services
-        db_path = current_app.config['DATABASE']
-        faiss_index_path = current_app.config['FAISS_INDEX_PATH']
+        # Serve repeated or near-duplicate questions from the semantic cache
+        query_cache = get_query_cache()
+        scope = (candidate_id, top_k, with_filters, strict)
+        answer_data = query_cache.get(question, scope)
         
-        db_repo = SQLiteRepository(db_path)
-        faiss_index = FAISSIndex(faiss_index_path)
-        embedding_service = EmbeddingService()
-        query_agent = QueryAgent(db_repo, faiss_index, embedding_service)
-        # Get answer from RAG pipeline
-        answer_data = query_agent.answer_question(
-            question=question,
-            candidate_id=candidate_id,
-            top_k=top_k
-        )
+        if answer_data is None:
+            question_embedding = get_embedding_service().embed_query(question)
+            answer_data = query_cache.get_similar(question_embedding, scope)
+            
+            if answer_data is None:
+                # Get answer from RAG pipeline
+                answer_data = get_query_agent().answer_question(
+                    question=question,
+                    candidate_id=candidate_id,
+                    top_k=top_k,
+                    question_embedding=question_embedding,
+                    with_filters=with_filters,
+                    strict=strict
+                )
+                if answer_data.get('confidence') != 'error':
+                    query_cache.put(question, question_embedding, answer_data, scope)
         
-        return {
+        response = {
             'question': question,
             'answer': answer_data['answer'],
             'context': answer_data['context'],
             'sources': answer_data['sources'],
             'confidence': answer_data.get('confidence', 'unknown')
-        }, 200
+        }
+        if with_filters:
+            response['filters'] = answer_data.get('filters', {})
+        
+        return response, 200
         
     except Exception as e:
         return {
@@ -66,6 +82,84 @@ def query_candidates():
         }, 500
 
 
+@query_bp.route('/query/stream', methods=['POST'])
+def query_candidates_stream():
+    """
+    Answer a question using RAG, streaming the answer as it is generated.
+    
+    Expected request JSON:
+    {
+        "question": "Who has experience with Python?",
+        "candidate_id": "optional-uuid-to-scope-search",
+        "top_k": 5,
+        "strict": false
+    }
+    
+    Returns:
+        Newline-delimited JSON events: one "context" event with context, sources
+        and confidence, "token" events with answer text, then "done" (or "error")
+    """
+    data = request.get_json()
+    if not data or 'question' not in data:
+        return {'error': 'No question provided'}, 400
+    
+    question = data['question']
+    candidate_id = data.get('candidate_id')
+    top_k = data.get('top_k', 10)
+    strict = bool(data.get('strict'))
+    
+    # Same cache entries as /query, so a streamed answer is reused by both endpoints
+    query_cache = get_query_cache()
+    scope = (candidate_id, top_k, False, strict)
+    question_embedding = None
+    answer_data = query_cache.get(question, scope)
+    
+    try:
+        if answer_data is None:
+            question_embedding = get_embedding_service().embed_query(question)
+            answer_data = query_cache.get_similar(question_embedding, scope)
+        query_agent = get_query_agent()
+    except Exception as e:
+        return {
+            'error': 'Query failed',
+            'message': str(e)
+        }, 500
+    
+    def generate():
+        if answer_data is not None:
+            yield {'event': 'context', 'context': answer_data['context'],
+                   'sources': answer_data['sources'], 'confidence': answer_data['confidence']}
+            yield {'event': 'token', 'text': answer_data['answer']}
+            yield {'event': 'done'}
+            return
+        
+        answer_parts = []
+        for event in query_agent.stream_answer(
+            question=question,
+            candidate_id=candidate_id,
+            top_k=top_k,
+            question_embedding=question_embedding,
+            strict=strict
+        ):
+            if event['event'] == 'context':
+                streamed = event
+            elif event['event'] == 'token':
+                answer_parts.append(event['text'])
+            elif event['event'] == 'done':
+                query_cache.put(question, question_embedding, {
+                    'answer': "".join(answer_parts).strip(),
+                    'context': streamed['context'],
+                    'sources': streamed['sources'],
+                    'confidence': streamed['confidence']
+                }, scope)
+            yield event
+    
+    return Response(
+        stream_with_context(current_app.json.dumps(event) + '\n' for event in generate()),
+        mimetype='application/x-ndjson'
+    )
+
+
 @query_bp.route('/search', methods=['POST'])
 def semantic_search():
     """
@@ -91,31 +185,19 @@ def semantic_search():
         candidate_id = data.get('candidate_id')
         top_k = data.get('top_k', 10)  # Increased default from 5 to 10 for more comprehensive results
         
-        # Initialize services
-        faiss_index_path = current_app.config['FAISS_INDEX_PATH']
-        db_path = current_app.config['DATABASE']
-        
-        faiss_index = FAISSIndex(faiss_index_path)
-        embedding_service = EmbeddingService()
-        db_repo = SQLiteRepository(db_path)
-        
-        # Generate query embedding
-        query_embedding = embedding_service.embed(search_query)
+        # Serve repeated or near-duplicate queries from the semantic cache
+        search_cache = get_search_cache()
+        scope = (candidate_id, top_k)
+        enriched_results = search_cache.get(search_query, scope)
         
-        # Search FAISS index
-        results = faiss_index.search(query_embedding, top_k=top_k, candidate_id=candidate_id)
-        
-        # Enrich results with candidate data
-        enriched_results = []
-        for result in results:
-            candidate = db_repo.get_candidate(result['metadata']['candidate_id'])
-            enriched_results.append({
-                'candidate_name': candidate.get('name') if candidate else 'Unknown',
-                'candidate_id': result['metadata']['candidate_id'],
-                'chunk_type': result['metadata']['chunk_type'],
-                'section': result['metadata'].get('section'),
-                'distance': result['distance']
-            })
+        if enriched_results is None:
+            # Generate query embedding
+            query_embedding = get_embedding_service().embed_query(search_query)
+            enriched_results = search_cache.get_similar(query_embedding, scope)
+            
+            if enriched_results is None:
+                enriched_results = _run_search(query_embedding, top_k, candidate_id)
+                search_cache.put(search_query, query_embedding, enriched_results, scope)
         
         return {
             'query': search_query,
@@ -130,6 +212,109 @@ def semantic_search():
         }, 500
 
 
+def _run_search(query_embedding, top_k, candidate_id):
+    """
+    Search the FAISS index and enrich the hits with candidate names.
+    
+    Args:
+        query_embedding (np.ndarray): Query embedding
+        top_k (int): Number of results to return
+        candidate_id (Optional[str]): Restrict results to this candidate
+        
+    Returns:
+        list: Search results with candidate info and similarity scores
+    """
+    faiss_index = get_search_index()
+    db_repo = get_db_repo()
+    
+    # Search FAISS index. Scoped searches only score that candidate's vectors,
+    # so they are not cut short by post-filtering the global nearest neighbors.
+    results = faiss_index.search(
+        query_embedding, k=top_k, candidate_id=candidate_id, include_text=False
+    )
+    
+    # Enrich results with candidate names, fetched in one query
+    names = db_repo.get_candidate_names(
+        [result['metadata']['candidate_id'] for result in results]
+    )
+    
+    return _enrich_results(results, names)
+
+
+def _enrich_results(results, names):
+    """
+    Format search hits with the name of the candidate they belong to.
+    
+    Args:
+        results (list): FAISS search results
+        names (dict): Candidate names keyed by candidate_id
+        
+    Returns:
+        list: Search results with candidate info and similarity scores
+    """
+    enriched_results = []
+    for result in results:
+        enriched_results.append({
+            'candidate_name': names.get(result['metadata']['candidate_id'], 'Unknown'),
+            'candidate_id': result['metadata']['candidate_id'],
+            'chunk_type': result['metadata']['chunk_type'],
+            'section': result['metadata'].get('section'),
+            'score': result['score']
+        })
+    
+    return enriched_results
+
+
+@query_bp.route('/search/batch', methods=['POST'])
+def batch_semantic_search():
+    """
+    Perform semantic search for several queries at once.
+    
+    The queries are embedded in one API call and searched in one FAISS call,
+    which spreads the work over FAISS's threads.
+    
+    Expected request JSON:
+    {
+        "queries": ["machine learning experience", "cloud certifications"],
+        "candidate_id": "optional-uuid",
+        "top_k": 5
+    }
+    
+    Returns:
+        JSON with one list of search results per query
+    """
+    try:
+        # Validate request
+        data = request.get_json()
+        if not data or not data.get('queries'):
+            return {'error': 'No queries provided'}, 400
+        
+        queries = data['queries']
+        candidate_id = data.get('candidate_id')
+        top_k = data.get('top_k', 10)
+        
+        query_matrix = stack_embeddings(get_embedding_service().embed_batch(queries))
+        result_lists = get_search_index().batch_search(
+            query_matrix, k=top_k, candidate_id=candidate_id, include_text=False
+        )
+        
+        # Candidate names for every hit of every query, fetched in one query
+        names = get_db_repo().get_candidate_names(
+            [result['metadata']['candidate_id'] for results in result_lists for result in results]
+        )
+        
+        return {
+            'queries': queries,
+            'results': [_enrich_results(results, names) for results in result_lists]
+        }, 200
+        
+    except Exception as e:
+        return {
+            'error': 'Batch search failed',
+            'message': str(e)
+        }, 500
+
+
 @query_bp.route('/filter-candidates', methods=['POST'])
 def filter_candidates():
     """
@@ -152,8 +337,7 @@ def filter_candidates():
         if not data:
             return {'error': 'No filter criteria provided'}, 400
         
-        db_path = current_app.config['DATABASE']
-        db_repo = SQLiteRepository(db_path)
+        db_repo = get_db_repo()
         
         # Filter candidates using various criteria
         candidates = db_repo.filter_candidates(
@@ -188,11 +372,8 @@ def get_candidate_context(candidate_id):
         JSON with candidate's full profile and indexed sections
     """
     try:
-        db_path = current_app.config['DATABASE']
-        faiss_index_path = current_app.config['FAISS_INDEX_PATH']
-        
-        db_repo = SQLiteRepository(db_path)
-        faiss_index = FAISSIndex(faiss_index_path)
+        db_repo = get_db_repo()
+        faiss_index = get_faiss_index()
         
         # Get candidate data
         candidate = db_repo.get_candidate(candidate_id)
@@ -235,8 +416,7 @@ def get_candidate_full_summary(candidate_id):
         JSON with complete candidate information
     """
     try:
-        db_path = current_app.config['DATABASE']
-        db_repo = SQLiteRepository(db_path)
+        db_repo = get_db_repo()
         
         # Get complete candidate data
         candidate = db_repo.get_candidate(candidate_id)
@@ -4,19 +4,24 @@ Upload routes for handling CV file uploads, parsing, and storage.
 
 import os
 import uuid
+from concurrent.futures import ThreadPoolExecutor
 from flask import Blueprint, request, jsonify, current_app
 from werkzeug.utils import secure_filename
 from services.text_extraction import TextExtractor
-from services.llm_parser import LLMParser
-from services.sqlite_repo import SQLiteRepository
-from services.embedding import EmbeddingService
-from services.faiss_index import FAISSIndex
+from services.faiss_index import stack_embeddings
+from services.registry import (
+    get_db_repo, get_faiss_index, get_embedding_service, get_llm_parser,
+    get_index_persister, invalidate_response_caches
+)
 
 upload_bp = Blueprint('upload', __name__)
 
 # Allowed file extensions
 ALLOWED_EXTENSIONS = {'pdf', 'docx'}
 
+# Worker threads for I/O-bound upload steps (embedding API calls)
+_executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix='upload')
+
 
 def allowed_file(filename):
     """
@@ -39,6 +44,7 @@ def upload_cv():
     Expected request:
     - file: PDF or DOCX file
     - candidate_name (optional): Name of the candidate
+    - no_cache (optional): "true" to re-parse even if this CV text was parsed before
     
     Returns:
         JSON response with candidate_id and parsing results
@@ -58,24 +64,30 @@ def upload_cv():
         # Generate candidate ID
         candidate_id = str(uuid.uuid4())
         
-        # Save uploaded file
+        # Extract text straight from the upload stream, before touching the disk
+        text_extractor = TextExtractor()
+        file_ext = file.filename.rsplit('.', 1)[1]
+        raw_text = text_extractor.extract_stream(file.stream, file_ext)
+        
+        if not raw_text:
+            return {'error': 'Could not extract text from file'}, 400
+        
+        # Save uploaded file only once it is known to be readable
         filename = secure_filename(file.filename)
         upload_folder = current_app.config['UPLOAD_FOLDER']
         os.makedirs(upload_folder, exist_ok=True)
         
         file_path = os.path.join(upload_folder, f"{candidate_id}_{filename}")
+        file.stream.seek(0)
         file.save(file_path)
         
-        # Extract text from file
-        text_extractor = TextExtractor()
-        raw_text = text_extractor.extract(file_path)
+        db_repo = get_db_repo()
         
-        if not raw_text:
-            return {'error': 'Could not extract text from file'}, 400
-        
-        # Parse structured data using LLM
-        llm_parser = LLMParser()
-        parsed_data = llm_parser.parse(raw_text)
+        # Parse structured data using LLM, reusing the result for identical CV text
+        parsed_data = _parse_cv(
+            get_llm_parser(), db_repo, raw_text,
+            use_cache=request.form.get('no_cache', '').lower() != 'true'
+        )
         
         # Ensure all expected fields exist with defaults
         if not isinstance(parsed_data.get('interests'), list):
@@ -91,34 +103,46 @@ def upload_cv():
         if candidate_name:
             parsed_data['name'] = candidate_name
         
-        # Store in SQLite
-        db_path = current_app.config['DATABASE']
-        db_repo = SQLiteRepository(db_path)
-        candidate_data = db_repo.insert_candidate(parsed_data)
-        
         # Generate embeddings for experience and projects
-        embedding_service = EmbeddingService()
-        faiss_index = FAISSIndex(current_app.config['FAISS_INDEX_PATH'])
+        embedding_service = get_embedding_service()
+        faiss_index = get_faiss_index()
         
         chunks = _create_searchable_chunks(parsed_data, candidate_id)
         
-        for chunk in chunks:
-            # Generate embedding
-            embedding = embedding_service.embed(chunk['text'])
-            
-            # Add to FAISS index with text content included for retrieval
-            faiss_index.add_vector(
-                embedding,
-                metadata={
-                    'candidate_id': candidate_id,
-                    'chunk_type': chunk['type'],
-                    'section': chunk.get('section', 'unknown'),
-                    'text': chunk['text']  # Store actual chunk text for retrieval
-                }
+        # Embed all chunks in a single API round-trip, on a worker thread so the
+        # network wait overlaps with the SQLite insert below
+        embed_future = (
+            _executor.submit(
+                _embed_chunk_texts, embedding_service, db_repo, [c['text'] for c in chunks]
             )
+            if chunks else None
+        )
         
-        # Save FAISS index
-        faiss_index.save()
+        # Store in SQLite, with the chunk texts kept alongside the candidate
+        candidate_data = db_repo.insert_candidate(parsed_data)
+        db_repo.insert_chunks(candidate_id, chunks)
+        
+        embeddings = embed_future.result() if embed_future else []
+        
+        if embeddings:
+            # Add to FAISS index in one bulk call, with text content included for retrieval
+            faiss_index.add_vectors(
+                stack_embeddings(embeddings),
+                metadatas=[
+                    {
+                        'candidate_id': candidate_id,
+                        'chunk_type': chunk['type'],
+                        'section': chunk.get('section', 'unknown'),
+                        'text': chunk['text']  # Store actual chunk text for retrieval
+                    }
+                    for chunk in chunks
+                ],
+                copy=False
+            )
+        
+        # Save FAISS index in the background
+        get_index_persister().mark_dirty()
+        invalidate_response_caches()
         
         return {
             'message': 'CV uploaded and processed successfully',
@@ -150,6 +174,77 @@ def upload_cv():
         }, 500
 
 
+def _parse_cv(llm_parser, db_repo, raw_text, use_cache=True):
+    """
+    Parse CV text with the LLM, using the parse cache for texts seen before.
+    
+    Args:
+        llm_parser (LLMParser): Parser used on a cache miss
+        db_repo (SQLiteRepository): Repository holding the parse cache
+        raw_text (str): Extracted CV text
+        use_cache (bool): Look up the cache before parsing
+        
+    Returns:
+        dict: Parsed CV data (a fresh copy the caller may modify)
+    """
+    text_hash = llm_parser.text_hash(raw_text)
+    if use_cache:
+        parsed_data = db_repo.get_parsed_cv(
+            text_hash, max_age_seconds=current_app.config['PARSE_CACHE_TTL']
+        )
+        if parsed_data is not None:
+            return parsed_data
+    
+    parsed_data, from_llm = llm_parser.parse_with_source(raw_text)
+    # A heuristic fallback parse would otherwise stick for the whole TTL
+    if from_llm:
+        db_repo.insert_parsed_cv(text_hash, parsed_data)
+    return parsed_data
+
+
+def _embed_chunk_texts(embedding_service, db_repo, texts):
+    """
+    Embed chunk texts, skipping duplicates and texts embedded by earlier uploads.
+    
+    Args:
+        embedding_service (EmbeddingService): Service used for texts not yet cached
+        db_repo (SQLiteRepository): Repository holding the persistent embedding cache
+        texts (list): Chunk texts, possibly with repeats
+        
+    Returns:
+        list: One embedding per input text, in input order
+    """
+    hashes = [embedding_service.text_hash(text) for text in texts]
+    embeddings = db_repo.get_embeddings(hashes)
+    
+    # Embed each missing text once, however often it repeats
+    missing = {}
+    for text_hash, text in zip(hashes, texts):
+        if text_hash not in embeddings:
+            missing.setdefault(text_hash, text)
+    
+    if missing:
+        new_embeddings = dict(zip(missing, embedding_service.embed_batch(list(missing.values()))))
+        db_repo.insert_embeddings(new_embeddings)
+        embeddings.update(new_embeddings)
+    
+    return [embeddings[text_hash] for text_hash in hashes]
+
+
+class _BlankDefaults(dict):
+    """Record mapping for str.format_map that renders missing fields as ''."""
+    
+    def __missing__(self, key):
+        return ''
+
+
+# Chunk text templates, one per repeated CV section
+_EXPERIENCE_TEMPLATE = "{title} at {company}. {description}"
+_PROJECT_TEMPLATE = "{name}. {description}. Technologies: {technologies}"
+_EDUCATION_TEMPLATE = "{degree} from {institution} ({year}). {details}"
+_CERTIFICATION_TEMPLATE = "{name} from {issuer} ({year})"
+
+
 def _create_searchable_chunks(parsed_data, candidate_id):
     """
     Create searchable chunks from parsed CV data.
@@ -162,66 +257,78 @@ def _create_searchable_chunks(parsed_data, candidate_id):
         list: List of chunks with text and metadata
     """
     chunks = []
+    join = ', '.join
     
     # Add summary/overview
-    if parsed_data.get('summary'):
+    summary = parsed_data.get('summary')
+    if summary:
         chunks.append({
             'type': 'summary',
-            'text': parsed_data['summary'],
+            'text': summary,
             'section': 'professional_summary'
         })
     
     # Add each experience entry
-    for idx, exp in enumerate(parsed_data.get('experience', [])):
-        exp_text = f"{exp.get('title', '')} at {exp.get('company', '')}. {exp.get('description', '')}"
-        chunks.append({
+    format_experience = _EXPERIENCE_TEMPLATE.format_map
+    chunks.extend(
+        {
             'type': 'experience',
-            'text': exp_text,
+            'text': format_experience(_BlankDefaults(exp)),
             'section': f"experience_{idx}"
-        })
+        }
+        for idx, exp in enumerate(parsed_data.get('experience', []))
+    )
     
     # Add each project entry
-    for idx, proj in enumerate(parsed_data.get('projects', [])):
-        proj_text = f"{proj.get('name', '')}. {proj.get('description', '')}. Technologies: {', '.join(proj.get('technologies', []))}"
-        chunks.append({
+    format_project = _PROJECT_TEMPLATE.format_map
+    chunks.extend(
+        {
             'type': 'project',
-            'text': proj_text,
+            'text': format_project(
+                _BlankDefaults(proj, technologies=join(proj.get('technologies', [])))
+            ),
             'section': f"project_{idx}"
-        })
+        }
+        for idx, proj in enumerate(parsed_data.get('projects', []))
+    )
     
     # Add skills as a single chunk
-    if parsed_data.get('skills'):
-        skills_text = f"Skills: {', '.join(parsed_data['skills'])}"
+    skills = parsed_data.get('skills')
+    if skills:
         chunks.append({
             'type': 'skills',
-            'text': skills_text,
+            'text': f"Skills: {join(skills)}",
             'section': 'skills'
         })
     
     # Add each education entry
-    for idx, edu in enumerate(parsed_data.get('education', [])):
-        edu_text = f"{edu.get('degree', '')} from {edu.get('institution', '')} ({edu.get('year', '')}). {edu.get('details', '')}"
-        chunks.append({
+    format_education = _EDUCATION_TEMPLATE.format_map
+    chunks.extend(
+        {
             'type': 'education',
-            'text': edu_text,
+            'text': format_education(_BlankDefaults(edu)),
             'section': f"education_{idx}"
-        })
+        }
+        for idx, edu in enumerate(parsed_data.get('education', []))
+    )
     
     # Add each certification entry
-    for idx, cert in enumerate(parsed_data.get('certifications', [])):
-        cert_text = f"{cert.get('name', '')} from {cert.get('issuer', '')} ({cert.get('year', '')})"
-        chunks.append({
+    format_certification = _CERTIFICATION_TEMPLATE.format_map
+    chunks.extend(
+        {
             'type': 'certification',
-            'text': cert_text,
+            'text': format_certification(_BlankDefaults(cert)),
             'section': f"certification_{idx}"
-        })
+        }
+        for idx, cert in enumerate(parsed_data.get('certifications', []))
+    )
     
     # Add interests/hobbies as a single chunk
-    if parsed_data.get('interests'):
-        interests_text = f"Interests and Hobbies: {', '.join(parsed_data['interests'])}"
+    interests = parsed_data.get('interests')
+    if interests:
         chunks.append({
             'type': 'interests',
-            'text': interests_text,
+            'text': f"Interests and Hobbies: {join(interests)}",
             'section': 'interests_hobbies'
         })
     
@@ -237,8 +344,7 @@ def list_candidates():
         JSON list of candidates with basic info
     """
     try:
-        db_path = current_app.config['DATABASE']
-        db_repo = SQLiteRepository(db_path)
+        db_repo = get_db_repo()
         candidates = db_repo.get_all_candidates()
         
         return {
@@ -265,8 +371,7 @@ def get_candidate(candidate_id):
         JSON with candidate's full parsed data
     """
     try:
-        db_path = current_app.config['DATABASE']
-        db_repo = SQLiteRepository(db_path)
+        db_repo = get_db_repo()
         candidate = db_repo.get_candidate(candidate_id)
         
         if not candidate:
@@ -293,8 +398,7 @@ def delete_candidate(candidate_id):
         JSON confirmation of deletion
     """
     try:
-        db_path = current_app.config['DATABASE']
-        db_repo = SQLiteRepository(db_path)
+        db_repo = get_db_repo()
         
         # Get candidate before deletion to get file path
         candidate = db_repo.get_candidate(candidate_id)
@@ -305,6 +409,10 @@ def delete_candidate(candidate_id):
         success = db_repo.delete_candidate(candidate_id)
         
         if success:
+            # Drop the candidate's chunk vectors from the search index
+            get_faiss_index().delete_candidate(candidate_id)
+            invalidate_response_caches()
+            
             # Try to delete uploaded file
             file_path = candidate.get('file_path')
             if file_path and os.path.exists(file_path):
@@ -3,33 +3,102 @@ Embedding service for generating vector embeddings from text.
 Uses OpenAI's embedding API to create dense vectors for semantic search.
 """
 
+import hashlib
 import os
 from typing import List, Optional
 import numpy as np
-from openai import OpenAI
+from services.openai_client import create_openai_client
+from services.query_cache import QueryCache
 import logging
 
 logger = logging.getLogger(__name__)
 
+try:
+    from numba import njit
+except ImportError:  # numba is optional; plain NumPy is used without it
+    njit = None
+
+
+if njit is not None:
+    @njit(cache=True, fastmath=True)
+    def _dot(a, b):
+        """Dot product of two float32 vectors as one fused loop."""
+        total = 0.0
+        for i in range(a.shape[0]):
+            total += a[i] * b[i]
+        return total
+    
+    @njit(cache=True, fastmath=True)
+    def _l2(a, b):
+        """Euclidean distance between two float32 vectors as one fused loop."""
+        total = 0.0
+        for i in range(a.shape[0]):
+            diff = a[i] - b[i]
+            total += diff * diff
+        return np.sqrt(total)
+else:
+    def _dot(a, b):
+        """Dot product of two vectors."""
+        return np.dot(a, b)
+    
+    def _l2(a, b):
+        """Euclidean distance between two vectors."""
+        return np.linalg.norm(a - b)
+
+
+# Random hyperplanes for LSH signatures, created once at import and shared
+# read-only by every request. Signatures of b bits use the first b rows.
+LSH_MAX_BITS = 64
+_LSH_W = np.random.default_rng(0).standard_normal((LSH_MAX_BITS, 1536), dtype=np.float32)
+_LSH_BIT_WEIGHTS = np.left_shift(np.uint64(1), np.arange(LSH_MAX_BITS, dtype=np.uint64))
+
+
+def signature(embedding: np.ndarray, bits: int = 16) -> int:
+    """
+    Compute the random-projection LSH signature of an embedding.
+    
+    Embeddings with a small angle between them agree on most bits, so equal
+    signatures mark likely near-duplicates.
+    
+    Args:
+        embedding (np.ndarray): 1D float32 embedding of dimension 1536
+        bits (int): Signature length, at most LSH_MAX_BITS
+        
+    Returns:
+        int: One bit per hyperplane, set when the embedding lies on its positive side
+    """
+    if not 0 < bits <= LSH_MAX_BITS:
+        raise ValueError(f"bits must be between 1 and {LSH_MAX_BITS}")
+    positive = (_LSH_W[:bits] @ embedding) > 0
+    return int(_LSH_BIT_WEIGHTS[:bits][positive].sum())
+
 
 class EmbeddingService:
     """Generate and manage text embeddings using OpenAI."""
     
-    def __init__(self, api_key: Optional[str] = None, model: str = "text-embedding-3-small"):
+    def __init__(self, api_key: Optional[str] = None, model: str = "text-embedding-3-small",
+                 query_cache_size: int = 1024, cache_repo=None):
         """
         Initialize the embedding service.
         
         Args:
             api_key (Optional[str]): OpenAI API key. Uses OPENAI_API_KEY env var if not provided.
             model (str): OpenAI embedding model to use (default: text-embedding-3-small)
+            query_cache_size (int): Number of query embeddings kept by embed_query()
+            cache_repo: Optional SQLiteRepository whose embeddings table persists
+                        query embeddings across restarts and worker processes
         """
         self.api_key = api_key or os.getenv('OPENAI_API_KEY')
         if not self.api_key:
             raise ValueError("OPENAI_API_KEY environment variable not set")
         
-        self.client = OpenAI(api_key=self.api_key)
+        self.client = create_openai_client(self.api_key)
         self.model = model
         self.embedding_dim = 1536  # For text-embedding-3-small
+        # Embeddings of recent questions/search queries; they do not depend on the
+        # indexed CVs, so unlike answer caches they stay valid after uploads
+        self._query_cache = QueryCache(max_size=query_cache_size, ttl_seconds=0)
+        self.cache_repo = cache_repo
     
     def embed(self, text: str) -> np.ndarray:
         """
@@ -39,7 +108,7 @@ class EmbeddingService:
             text (str): Text to embed
             
         Returns:
-            np.ndarray: Embedding vector
+            np.ndarray: Unit-length embedding vector
         """
         if not text or not text.strip():
             raise ValueError("Text cannot be empty")
@@ -51,12 +120,44 @@ class EmbeddingService:
             )
             
             embedding = response.data[0].embedding
-            return np.array(embedding, dtype=np.float32)
+            return self._normalize(np.array(embedding, dtype=np.float32))
         
         except Exception as e:
             logger.error(f"Error generating embedding: {str(e)}")
             raise
     
+    def embed_query(self, text: str) -> np.ndarray:
+        """
+        Embed a user question or search query, reusing recent embeddings.
+        
+        Queries that differ only in case or surrounding/repeated whitespace
+        share one cache entry. Misses in the in-memory LRU are looked up in the
+        persistent embedding cache of cache_repo before calling the API.
+        
+        Args:
+            text (str): Query text
+            
+        Returns:
+            np.ndarray: Unit-length embedding vector (shared; do not modify in place)
+        """
+        key = ' '.join(text.lower().split())
+        embedding = self._query_cache.get(key)
+        if embedding is not None:
+            return embedding
+        
+        if self.cache_repo is None:
+            embedding = self.embed(text)
+        else:
+            # Prefixed so query keys never collide with chunk text hashes
+            text_hash = self.text_hash(f"query: {key}")
+            embedding = self.cache_repo.get_embeddings([text_hash]).get(text_hash)
+            if embedding is None:
+                embedding = self.embed(text)
+                self.cache_repo.insert_embeddings({text_hash: embedding})
+        
+        self._query_cache.put(key, embedding)
+        return embedding
+    
     def embed_batch(self, texts: List[str]) -> List[np.ndarray]:
         """
         Generate embeddings for multiple texts in batch.
@@ -65,7 +166,7 @@ class EmbeddingService:
             texts (List[str]): List of texts to embed
             
         Returns:
-            List[np.ndarray]: List of embedding vectors
+            List[np.ndarray]: List of unit-length embedding vectors
         """
         if not texts:
             raise ValueError("Text list cannot be empty")
@@ -76,35 +177,67 @@ class EmbeddingService:
                 model=self.model
             )
             
-            # Sort by index to ensure order
+            # Sort by index to ensure order, then normalize all rows in one pass
             embeddings = sorted(response.data, key=lambda x: x.index)
-            return [np.array(e.embedding, dtype=np.float32) for e in embeddings]
+            matrix = np.array([e.embedding for e in embeddings], dtype=np.float32)
+            norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+            norms[norms == 0] = 1.0
+            return list(matrix / norms)
         
         except Exception as e:
             logger.error(f"Error generating batch embeddings: {str(e)}")
             raise
     
+    def text_hash(self, text: str) -> str:
+        """
+        Hash a text for embedding caching.
+        
+        The hash covers the model name and the whitespace-normalized text, so
+        cached vectors are never reused across embedding models.
+        
+        Args:
+            text (str): Text to hash
+            
+        Returns:
+            str: Hex SHA-1 digest
+        """
+        normalized = ' '.join(text.split())
+        return hashlib.sha1(f"{self.model}\n{normalized}".encode('utf-8')).hexdigest()
+    
+    @staticmethod
+    def _normalize(embedding: np.ndarray) -> np.ndarray:
+        """
+        Scale an embedding to unit L2 length.
+        
+        Args:
+            embedding (np.ndarray): Embedding vector
+            
+        Returns:
+            np.ndarray: Unit-length embedding (unchanged if it is all zeros)
+        """
+        norm = np.linalg.norm(embedding)
+        if norm == 0:
+            return embedding
+        return embedding / norm
+    
     def similarity(self, embedding1: np.ndarray, embedding2: np.ndarray) -> float:
         """
         Calculate cosine similarity between two embeddings.
         
+        Embeddings returned by embed()/embed_batch() are unit vectors, so the
+        cosine similarity reduces to a single dot product.
+        
         Args:
-            embedding1 (np.ndarray): First embedding vector
-            embedding2 (np.ndarray): Second embedding vector
+            embedding1 (np.ndarray): First unit-length embedding vector
+            embedding2 (np.ndarray): Second unit-length embedding vector
             
         Returns:
             float: Cosine similarity score (0-1)
         """
-        # Normalize vectors
-        norm1 = np.linalg.norm(embedding1)
-        norm2 = np.linalg.norm(embedding2)
-        
-        if norm1 == 0 or norm2 == 0:
-            return 0.0
-        
-        # Cosine similarity
-        similarity = np.dot(embedding1, embedding2) / (norm1 * norm2)
-        return float(similarity)
+        return float(_dot(
+            np.ascontiguousarray(embedding1, dtype=np.float32),
+            np.ascontiguousarray(embedding2, dtype=np.float32)
+        ))
     
     def distance(self, embedding1: np.ndarray, embedding2: np.ndarray) -> float:
         """
@@ -117,4 +250,7 @@ class EmbeddingService:
         Returns:
             float: Euclidean distance
         """
-        return float(np.linalg.norm(embedding1 - embedding2))
+        return float(_l2(
+            np.ascontiguousarray(embedding1, dtype=np.float32),
+            np.ascontiguousarray(embedding2, dtype=np.float32)
+        ))
@@ -4,61 +4,846 @@ Maintains vector index with candidate_id metadata for filtered retrieval.
 """
 
 import os
+import hashlib
 import json
+import queue
+import threading
+import time
+from collections import defaultdict
 from typing import Optional, List, Dict, Any
 import numpy as np
 import faiss
+import msgpack
 import logging
 
+from services.query_cache import QueryCache
+
+try:
+    import fcntl
+except ImportError:  # Not available on Windows; the single-writer check is skipped there
+    fcntl = None
+
 logger = logging.getLogger(__name__)
 
+# Dimension of text-embedding-3-small vectors
+EMBEDDING_DIM = 1536
+
+# Vectors are L2-normalized on insert, so inner product is cosine similarity
+METRIC = faiss.METRIC_INNER_PRODUCT
+
+# HNSW graph build / search breadth
+HNSW_EF_CONSTRUCTION = 200
+HNSW_EF_SEARCH = 64
+
+# Inverted lists probed per IVF search
+IVF_NPROBE = 16
+
+# Candidate-scoped searches over at most this many vectors are scored exactly
+# on just those vectors; larger scopes pass an IDSelector to the index
+EXACT_FILTER_MAX = 4096
+
+# Metadata changes are appended to a log between saves; the full metadata file
+# is only rewritten once the log grows past this size
+WAL_COMPACT_BYTES = 10 * 1024 * 1024
+
+# Memory-map the stored vectors (flat codes) where this FAISS build supports it
+MMAP_FLAGS = getattr(faiss, 'IO_FLAG_MMAP_IFC', faiss.IO_FLAG_MMAP)
+
+
+def _is_ivf(index: faiss.Index) -> bool:
+    """Check whether an index (CPU or GPU) is an IVF index."""
+    return (
+        faiss.try_extract_index_ivf(index) is not None
+        # GPU classes only exist in faiss-gpu builds
+        or isinstance(index, getattr(faiss, 'GpuIndexIVF', ()))
+    )
+
+
+def stack_embeddings(embeddings: List[np.ndarray]) -> np.ndarray:
+    """
+    Copy embeddings into one pre-allocated C-contiguous float32 matrix.
+    
+    Each vector is copied (and cast) exactly once, instead of stacking and then
+    converting the stacked array.
+    
+    Args:
+        embeddings (List[np.ndarray]): Embedding vectors of equal length
+        
+    Returns:
+        np.ndarray: (N, d) float32 matrix, one embedding per row
+    """
+    if not embeddings:
+        return np.empty((0, EMBEDDING_DIM), dtype=np.float32)
+    
+    out = np.empty((len(embeddings), np.asarray(embeddings[0]).size), dtype=np.float32)
+    for i, embedding in enumerate(embeddings):
+        np.copyto(out[i], np.asarray(embedding).ravel(), casting='same_kind')
+    return out
+
+
+class ChunkMetadata:
+    """
+    Column-oriented metadata for indexed chunks; row i describes vector ID i.
+    
+    candidate_id, chunk_type and section live in parallel NumPy string arrays so
+    filtering and result enrichment touch only the columns they need. Chunk texts
+    are kept in a separate file that is only read when a text is requested.
+    """
+    
+    def __init__(self, texts_path: Optional[str] = None):
+        """
+        Initialize an empty metadata store.
+        
+        Args:
+            texts_path (Optional[str]): File holding the chunk texts, loaded on first access
+        """
+        self.candidate_ids = np.empty(0, dtype='U36')
+        self.chunk_types = np.empty(0, dtype='U16')
+        self.sections = np.empty(0, dtype='U32')
+        self.removed = np.empty(0, dtype=bool)
+        # candidate_id -> vector IDs, so per-candidate lookups cost O(chunks of that candidate)
+        self._by_candidate: Dict[str, List[int]] = defaultdict(list)
+        self.texts_path = texts_path
+        # None until the texts file has been read
+        self._texts: Optional[List[Optional[str]]] = None if texts_path else []
+    
+    def __len__(self) -> int:
+        return self.candidate_ids.shape[0]
+    
+    @property
+    def texts(self) -> List[Optional[str]]:
+        """Chunk texts, read from texts_path on first access."""
+        if self._texts is None:
+            if self.texts_path and os.path.exists(self.texts_path):
+                with open(self.texts_path, 'rb') as f:
+                    self._texts = msgpack.unpackb(f.read(), raw=False)
+            else:
+                self._texts = []
+            # Pad rows whose text was never stored
+            self._texts.extend([None] * (len(self) - len(self._texts)))
+        return self._texts
+    
+    @property
+    def texts_loaded(self) -> bool:
+        """Whether the chunk texts are held in memory."""
+        return self._texts is not None
+    
+    def append(self, metadatas: List[Dict[str, Any]]):
+        """
+        Append one row per metadata dict.
+        
+        Args:
+            metadatas (List[Dict]): Dicts with candidate_id, chunk_type, section and text
+        """
+        texts = self.texts
+        candidate_ids = [m.get('candidate_id') or '' for m in metadatas]
+        self._index_candidates(candidate_ids, start=len(self))
+        self.candidate_ids = np.concatenate([
+            self.candidate_ids, np.array(candidate_ids, dtype=str)
+        ])
+        self.chunk_types = np.concatenate([
+            self.chunk_types, np.array([m.get('chunk_type') or '' for m in metadatas], dtype=str)
+        ])
+        self.sections = np.concatenate([
+            self.sections, np.array([m.get('section') or '' for m in metadatas], dtype=str)
+        ])
+        self.removed = np.concatenate([
+            self.removed, np.array([bool(m.get('removed')) for m in metadatas], dtype=bool)
+        ])
+        texts.extend(m.get('text') for m in metadatas)
+    
+    def drop(self, rows: np.ndarray):
+        """
+        Delete rows; the rows after them move up so row i stays vector ID i.
+        
+        Args:
+            rows (np.ndarray): Row numbers to delete
+        """
+        keep = np.ones(len(self), dtype=bool)
+        keep[rows] = False
+        self._texts = [text for text, kept in zip(self.texts, keep.tolist()) if kept]
+        self.candidate_ids = self.candidate_ids[keep]
+        self.chunk_types = self.chunk_types[keep]
+        self.sections = self.sections[keep]
+        self.removed = self.removed[keep]
+        self._by_candidate = defaultdict(list)
+        self._index_candidates(self.candidate_ids.tolist(), start=0)
+    
+    def get(self, vector_id: int, include_text: bool = True) -> Dict[str, Any]:
+        """
+        Build the metadata dict of one vector.
+        
+        Args:
+            vector_id (int): Vector ID (row)
+            include_text (bool): Include the chunk text (loads the texts file if needed)
+            
+        Returns:
+            Dict: Metadata of the vector, or an empty dict for unknown IDs
+        """
+        if not 0 <= vector_id < len(self):
+            return {}
+        
+        metadata = {
+            'candidate_id': str(self.candidate_ids[vector_id]),
+            'chunk_type': str(self.chunk_types[vector_id]),
+            'section': str(self.sections[vector_id])
+        }
+        if include_text:
+            metadata['text'] = self.texts[vector_id]
+        if self.removed[vector_id]:
+            metadata['removed'] = True
+        return metadata
+    
+    def get_many(self, vector_ids: np.ndarray, include_text: bool = True) -> List[Dict[str, Any]]:
+        """
+        Build the metadata dicts of several vectors with one gather per column.
+        
+        Args:
+            vector_ids (np.ndarray): Vector IDs (rows)
+            include_text (bool): Include the chunk texts (loads the texts file if needed)
+            
+        Returns:
+            List[Dict]: Metadata per vector ID, empty dicts for unknown IDs
+        """
+        vector_ids = np.asarray(vector_ids, dtype=np.int64)
+        known = (vector_ids >= 0) & (vector_ids < len(self))
+        rows = vector_ids[known]
+        
+        columns = [
+            self.candidate_ids[rows].tolist(),
+            self.chunk_types[rows].tolist(),
+            self.sections[rows].tolist(),
+            self.removed[rows].tolist()
+        ]
+        if include_text:
+            texts = self.texts
+            columns.append([texts[row] for row in rows.tolist()])
+        
+        found = []
+        for values in zip(*columns):
+            metadata = {'candidate_id': values[0], 'chunk_type': values[1], 'section': values[2]}
+            if include_text:
+                metadata['text'] = values[4]
+            if values[3]:
+                metadata['removed'] = True
+            found.append(metadata)
+        
+        if rows.shape[0] == vector_ids.shape[0]:
+            return found
+        found_iter = iter(found)
+        return [next(found_iter) if is_known else {} for is_known in known.tolist()]
+    
+    def rows_for_candidate(self, candidate_id: str) -> np.ndarray:
+        """
+        Get the vector IDs belonging to a candidate, skipping removed rows.
+        
+        Args:
+            candidate_id (str): The candidate's unique identifier
+            
+        Returns:
+            np.ndarray: int64 vector IDs in ascending order
+        """
+        rows = np.array(self._by_candidate.get(candidate_id, ()), dtype=np.int64)
+        return rows[~self.removed[rows]]
+    
+    def _index_candidates(self, candidate_ids: List[str], start: int):
+        """
+        Add rows to the candidate_id -> vector IDs map.
+        
+        Args:
+            candidate_ids (List[str]): candidate_id of each new row
+            start (int): Vector ID of the first new row
+        """
+        for vector_id, candidate_id in enumerate(candidate_ids, start):
+            self._by_candidate[candidate_id].append(vector_id)
+    
+    def to_columns(self) -> Dict[str, Any]:
+        """
+        Get the metadata columns (without texts) in a msgpack/JSON-serializable form.
+        
+        Returns:
+            Dict: Column name -> list of values
+        """
+        return {
+            'format': 'columns',
+            'candidate_id': self.candidate_ids.tolist(),
+            'chunk_type': self.chunk_types.tolist(),
+            'section': self.sections.tolist(),
+            'removed': self.removed.tolist()
+        }
+    
+    @classmethod
+    def from_columns(cls, columns: Dict[str, Any], texts_path: Optional[str] = None) -> 'ChunkMetadata':
+        """
+        Rebuild a store from to_columns() output.
+        
+        Args:
+            columns (Dict): Saved metadata columns
+            texts_path (Optional[str]): File holding the chunk texts
+            
+        Returns:
+            ChunkMetadata: Restored store
+        """
+        store = cls(texts_path)
+        store.candidate_ids = np.array(columns['candidate_id'], dtype=str).reshape(-1)
+        store.chunk_types = np.array(columns['chunk_type'], dtype=str).reshape(-1)
+        store.sections = np.array(columns['section'], dtype=str).reshape(-1)
+        store.removed = np.array(columns['removed'], dtype=bool).reshape(-1)
+        store._index_candidates(store.candidate_ids.tolist(), start=0)
+        return store
+    
+    @classmethod
+    def from_records(cls, records: Dict[str, Dict[str, Any]]) -> 'ChunkMetadata':
+        """
+        Convert the legacy {vector_id: metadata dict} format.
+        
+        Args:
+            records (Dict): Metadata dicts keyed by string vector ID
+            
+        Returns:
+            ChunkMetadata: Store with texts held in memory
+        """
+        store = cls()
+        size = max((int(k) for k in records), default=-1) + 1
+        store.append([records.get(str(vector_id), {}) for vector_id in range(size)])
+        return store
+
 
 class FAISSIndex:
     """Manage FAISS vector index for semantic search on CV embeddings."""
     
-    def __init__(self, index_path: str = 'data/faiss.index'):
+    def __init__(self, index_path: str = 'data/faiss.index', index_factory: str = 'HNSW32,SQfp16',
+                 train_size: int = 1000, mmap: bool = False,
+                 ef_search: int = HNSW_EF_SEARCH,
+                 large_index_factory: str = 'IVF1024,PQ48x8', large_index_size: int = 10000,
+                 nprobe: int = IVF_NPROBE,
+                 search_cache_size: int = 2000, search_cache_ttl: float = 300.0,
+                 gpu: bool = False):
         """
         Initialize or load FAISS index.
         
         Args:
             index_path (str): Path to the FAISS index file
+            index_factory (str): FAISS index_factory description, e.g. "HNSW32,SQfp16"
+                                 (graph search over float16 vectors, default), "HNSW32"
+                                 (float32 vectors), "Flat" (exact), "SQ8" (int8, 4x
+                                 smaller) or "PQ64x4fs" (PQ FastScan)
+            train_size (int): Number of vectors to collect before training an index
+                              type that needs training. Until then vectors are kept
+                              in an exact flat index.
+            mmap (bool): Memory-map the vector data of an existing index file read-only
+                         instead of copying it into RAM. The index is loaded into memory
+                         on the first write.
+            ef_search (int): HNSW search breadth (higher = better recall, slower).
+                             Raised to k for searches that request more results.
+            large_index_factory (str): Compressed IVF index type the index is rebuilt as
+                                       once it holds large_index_size vectors
+                                       ("IVF1024,PQ48x8" stores 48 bytes per vector).
+                                       Empty string keeps index_factory at any size.
+            large_index_size (int): Vector count at which large_index_factory takes over
+            nprobe (int): Number of IVF lists scanned per search
+            search_cache_size (int): Number of search() results memoized per query vector
+                                     (0 disables the cache)
+            search_cache_ttl (float): Seconds a memoized search result stays valid
+            gpu (bool): Copy the index to the GPU(s) with faiss.index_cpu_to_gpu when
+                        faiss-gpu and a CUDA device are available. Index types without
+                        a GPU implementation (e.g. HNSW) stay on the CPU.
         """
         self.index_path = index_path
-        self.metadata_path = index_path.replace('.index', '_metadata.json')
-        self.index: Optional[faiss.IndexFlatL2] = None
-        self.metadata: Dict[int, Dict] = {}
+        self.metadata_path = index_path.replace('.index', '_metadata.msgpack')
+        self.texts_path = index_path.replace('.index', '_texts.msgpack')
+        # Written by older versions; migrated to msgpack on first load
+        self.legacy_metadata_path = index_path.replace('.index', '_metadata.json')
+        self.legacy_texts_path = index_path.replace('.index', '_texts.json')
+        # Append-only log of metadata changes made since the metadata file was written
+        self.wal_path = self.metadata_path + '.wal'
+        self._wal = None
+        # Held by the one process allowed to change the index files
+        self.lock_path = index_path + '.lock'
+        self._writer_lock = None
+        # Whether the index holds vectors that have not been written to index_path
+        self._index_dirty = False
+        # Bumped whenever vectors are deleted and the remaining IDs renumbered
+        self._removals = 0
+        # Rows flagged as removed whose vectors are still in the index
+        self._tombstones = 0
+        self.index_factory = index_factory
+        self.train_size = train_size
+        self.mmap = mmap
+        self.ef_search = ef_search
+        self.large_index_factory = large_index_factory
+        self.large_index_size = large_index_size
+        self.nprobe = nprobe
+        self.gpu = gpu
+        # True while the index lives on the GPU(s); saves copy it back to the CPU
+        self.on_gpu = False
+        self._gpu_resources = None
+        # True while the index is a read-only memory map of index_path
+        self._read_only = False
+        self.index: Optional[faiss.Index] = None
+        self.metadata = ChunkMetadata(self.texts_path)
         self.next_id = 0
-        
+        # Shared across request threads, so index access is serialized
+        self._lock = threading.RLock()
+        # Serializes writers of the index files
+        self._save_lock = threading.Lock()
+        # Rebuilds the index (large index type, deletions) without blocking
+        # searches and uploads
+        self._rebuild_thread: Optional[threading.Thread] = None
+        # Memoized search() results; keys include _version, which every write bumps
+        self._search_cache = QueryCache(search_cache_size, search_cache_ttl) if search_cache_size else None
+        self._version = 0
         self._load_or_create_index()
     
     def _load_or_create_index(self):
         """Load existing index or create new one."""
         try:
             if os.path.exists(self.index_path):
-                self.index = faiss.read_index(self.index_path)
-                logger.info(f"Loaded existing FAISS index from {self.index_path}")
+                if self.mmap:
+                    self.index = self._configure_index(
+                        faiss.read_index(self.index_path, MMAP_FLAGS | faiss.IO_FLAG_READ_ONLY)
+                    )
+                    # Only flat code storage (Flat, HNSW, SQ, PQ) is mapped; IVF
+                    # inverted lists are read into memory and can be written directly
+                    self._read_only = not _is_ivf(self.index)
+                else:
+                    self.index = self._configure_index(faiss.read_index(self.index_path))
+                logger.info(f"Loaded existing FAISS index from {self.index_path} (mmap={self.mmap})")
             else:
-                # Create new index with L2 distance (Euclidean)
-                # Dimension should match embedding dimension (1536 for text-embedding-3-small)
-                self.index = faiss.IndexFlatL2(1536)
-                logger.info("Created new FAISS index")
+                self.index = self._create_index()
+                logger.info(f"Created new FAISS index ({self.index_factory})")
             
             # Load metadata
+            migrated = False
             if os.path.exists(self.metadata_path):
-                with open(self.metadata_path, 'r') as f:
-                    self.metadata = json.load(f)
-                self.next_id = max(int(k) for k in self.metadata.keys()) + 1 if self.metadata else 0
+                with open(self.metadata_path, 'rb') as f:
+                    saved = msgpack.unpackb(f.read(), raw=False)
+                self.metadata = ChunkMetadata.from_columns(saved, self.texts_path)
+                self.next_id = saved.get('next_id', len(self.metadata))
                 logger.info(f"Loaded metadata with {len(self.metadata)} entries")
+            elif os.path.exists(self.legacy_metadata_path):
+                self._load_legacy_metadata()
+                migrated = True
+                self.next_id = len(self.metadata)
+                logger.info(f"Migrating {len(self.metadata)} JSON metadata entries to msgpack")
             else:
-                self.metadata = {}
+                self.metadata = ChunkMetadata(self.texts_path)
                 self.next_id = 0
+            
+            replayed = self._replay_wal()
+            self._open_wal()
+            
+            converted = self.index.metric_type != METRIC
+            if converted:
+                self._convert_to_inner_product()
+            
+            self._maybe_rebuild()
+            self._move_to_gpu()
+            
+            if converted or migrated or replayed:
+                # Persist the conversion (and fold the replayed log into the
+                # metadata file) so it only runs once
+                try:
+                    self.save(compact=True)
+                except Exception as e:
+                    logger.error(f"Could not save converted index: {str(e)}")
+            
+            # Removals that were not compacted away before the last shutdown
+            with self._lock:
+                self._tombstones = int(np.count_nonzero(self.metadata.removed))
+                if self._tombstones:
+                    self._start_rebuild()
         
         except Exception as e:
             logger.error(f"Error loading index: {str(e)}")
             # Create fresh index
-            self.index = faiss.IndexFlatL2(1536)
-            self.metadata = {}
+            self.index = self._create_index()
+            self._read_only = False
+            self.on_gpu = False
+            self.metadata = ChunkMetadata(self.texts_path)
             self.next_id = 0
+            self._move_to_gpu()
+            if self._wal is None:
+                self._open_wal()
+    
+    def _load_legacy_metadata(self):
+        """Load metadata and texts from the JSON files written by older versions."""
+        with open(self.legacy_metadata_path, 'r') as f:
+            saved = json.load(f)
+        if saved.get('format') == 'columns':
+            self.metadata = ChunkMetadata.from_columns(saved, self.texts_path)
+            texts = []
+            if os.path.exists(self.legacy_texts_path):
+                with open(self.legacy_texts_path, 'r') as f:
+                    texts = json.load(f)
+            # Hold the texts in memory so the next save() writes them as msgpack
+            self.metadata._texts = texts + [None] * (len(self.metadata) - len(texts))
+        else:
+            # Older index files stored one dict per vector
+            self.metadata = ChunkMetadata.from_records(saved)
+            self.metadata.texts_path = self.texts_path
+    
+    def _replay_wal(self) -> bool:
+        """
+        Apply the metadata changes logged since the metadata file was written.
+        
+        Rows already in the metadata file and rows whose vectors never made it
+        into the index file are skipped.
+        
+        Returns:
+            bool: Whether the log held any records
+        """
+        if not os.path.exists(self.wal_path):
+            return False
+        
+        replayed = False
+        with open(self.wal_path, 'rb') as f:
+            try:
+                for record in msgpack.Unpacker(f, raw=False):
+                    replayed = True
+                    if record[0] == 'add':
+                        _, start, metadatas = record
+                        if start <= len(self.metadata):
+                            begin = len(self.metadata) - start
+                            end = max(self.index.ntotal - start, begin)
+                            rows = metadatas[begin:end]
+                            if rows:
+                                self.metadata.append(rows)
+                                self.next_id += len(rows)
+            except (ValueError, msgpack.UnpackException) as e:
+                logger.warning(f"Ignoring corrupt tail of {self.wal_path}: {str(e)}")
+        
+        if replayed:
+            logger.info(f"Replayed metadata log, {len(self.metadata)} entries")
+        return replayed
+    
+    def _open_wal(self):
+        """Open the metadata log for appending."""
+        os.makedirs(os.path.dirname(self.wal_path) or '.', exist_ok=True)
+        self._wal = open(self.wal_path, 'ab')
+    
+    def _log(self, record: list):
+        """Append one change record to the metadata log (lock must be held)."""
+        self._wal.write(msgpack.packb(record, use_bin_type=True))
+        self._wal.flush()
+    
+    def _create_index(self) -> faiss.Index:
+        """
+        Create an empty index for the configured index type.
+        
+        Index types that need training start out as an exact flat index;
+        _maybe_rebuild() swaps in the configured type once enough vectors exist.
+        
+        Returns:
+            faiss.Index: Empty index scored by inner product (cosine on unit vectors)
+        """
+        index = faiss.index_factory(EMBEDDING_DIM, self.index_factory, METRIC)
+        if not index.is_trained:
+            return faiss.IndexFlatIP(EMBEDDING_DIM)
+        return self._configure_index(index)
+    
+    def _configure_index(self, index: faiss.Index) -> faiss.Index:
+        """
+        Apply search/build parameters that are not part of the factory string.
+        
+        Args:
+            index (faiss.Index): Index to configure
+            
+        Returns:
+            faiss.Index: The same index
+        """
+        hnsw = getattr(index, 'hnsw', None)
+        if hnsw is not None:
+            hnsw.efConstruction = HNSW_EF_CONSTRUCTION
+            hnsw.efSearch = self.ef_search
+        
+        ivf = faiss.try_extract_index_ivf(index)
+        if ivf is not None:
+            ivf.nprobe = self.nprobe
+            # Lets vectors be reconstructed by ID (8 bytes per vector)
+            if ivf.direct_map.no():
+                ivf.make_direct_map()
+        return index
+    
+    def _maybe_rebuild(self):
+        """
+        Rebuild a flat index into the configured index type.
+        
+        Happens right away for types that need no training (e.g. an existing
+        flat index file loaded with HNSW configured), otherwise once at least
+        train_size vectors have been collected. Vector positions are kept,
+        so metadata IDs stay valid.
+        
+        Once the index reaches large_index_size vectors it is rebuilt as
+        large_index_factory instead, on a background thread.
+        """
+        if self._needs_large_rebuild():
+            self._start_rebuild()
+            return
+        
+        # A flat index on the GPU stays flat: HNSW has no GPU implementation
+        if self.index_factory == 'Flat' or not isinstance(self.index, faiss.IndexFlat):
+            return
+        
+        target = self._configure_index(
+            faiss.index_factory(EMBEDDING_DIM, self.index_factory, METRIC)
+        )
+        if not target.is_trained and self.index.ntotal < self.train_size:
+            return
+        
+        vectors = self.index.reconstruct_n(0, self.index.ntotal)
+        if not target.is_trained:
+            target.train(vectors)
+        target.add(vectors)
+        self.index = target
+        self._read_only = False
+        self.on_gpu = False
+        logger.info(f"Rebuilt FAISS index as {self.index_factory} with {target.ntotal} vectors")
+    
+    def _convert_to_inner_product(self):
+        """Re-add the vectors of an index saved with L2 distance as normalized IP vectors."""
+        vectors = np.ascontiguousarray(
+            self.index.reconstruct_n(0, self.index.ntotal), dtype=np.float32
+        )
+        faiss.normalize_L2(vectors)
+        
+        self.index = faiss.IndexFlatIP(EMBEDDING_DIM)
+        self.index.add(vectors)
+        self._read_only = False
+        self._index_dirty = True
+        logger.info(f"Converted L2 FAISS index with {self.index.ntotal} vectors to inner product")
+    
+    def _needs_large_rebuild(self) -> bool:
+        """Check whether the index has outgrown index_factory (lock must be held)."""
+        return bool(
+            self.large_index_factory
+            and self.index.ntotal >= self.large_index_size
+            and not _is_ivf(self.index)
+        )
+    
+    def _start_rebuild(self):
+        """Start the background rebuild thread unless it is already running (lock must be held)."""
+        if self._rebuild_thread is None:
+            self._rebuild_thread = threading.Thread(
+                target=self._run_rebuilds, name='faiss-rebuild', daemon=True
+            )
+            self._rebuild_thread.start()
+    
+    def _run_rebuilds(self):
+        """
+        Run background rebuilds until the index needs none.
+        
+        Switching to large_index_factory and compacting deleted vectors away both
+        rebuild the whole index, so they share this thread and never overlap.
+        """
+        while True:
+            with self._lock:
+                if self._needs_large_rebuild():
+                    rebuild = self._build_large_index
+                elif self._tombstones:
+                    rebuild = self._compact
+                else:
+                    self._rebuild_thread = None
+                    return
+            
+            try:
+                rebuild()
+            except Exception as e:
+                logger.error(f"Error rebuilding FAISS index: {str(e)}")
+                with self._lock:
+                    self._rebuild_thread = None
+                return
+    
+    def _build_large_index(self):
+        """
+        Train and fill a large_index_factory index, then swap it in.
+        
+        Training runs outside the lock, so the current index keeps serving
+        searches and accepting vectors; vectors added meanwhile are copied
+        over before the swap.
+        """
+        with self._lock:
+            ntotal = self.index.ntotal
+            removals = self._removals
+            vectors = self._cpu_index().reconstruct_n(0, ntotal)
+        
+        target = self._configure_index(
+            faiss.index_factory(EMBEDDING_DIM, self.large_index_factory, METRIC)
+        )
+        target.train(vectors)
+        target.add(vectors)
+        
+        with self._lock:
+            if self._removals != removals:
+                # Vectors were deleted (and the rest renumbered) while training;
+                # _run_rebuilds() starts over
+                logger.info("Vectors were deleted during the index rebuild, starting over")
+                return
+            
+            # Catch up with vectors added while training
+            if self.index.ntotal > ntotal:
+                target.add(
+                    self._cpu_index().reconstruct_n(ntotal, self.index.ntotal - ntotal)
+                )
+            self.index = target
+            self._read_only = False
+            self._index_dirty = True
+            self.on_gpu = False
+            self._move_to_gpu()
+            self._invalidate_caches()
+        
+        logger.info(f"Rebuilt FAISS index as {self.large_index_factory} with {target.ntotal} vectors")
+        self.save()
+    
+    def _compact(self):
+        """
+        Rebuild the index without the rows flagged as removed, then swap it in.
+        
+        The surviving vectors are re-added to an emptied copy outside the lock,
+        so searches and uploads continue while the graph or inverted lists are
+        built; until the swap, searches skip the removed rows.
+        """
+        # Persist the removed flags before the slow part
+        self.save(compact=True)
+        
+        with self._lock:
+            # A memory-mapped index is a view of the file, which clone_index()
+            # would share and reset() cannot clear
+            self._ensure_writable()
+            ntotal = self.index.ntotal
+            removals = self._removals
+            rows = np.flatnonzero(self.metadata.removed)
+            keep = np.ones(ntotal, dtype=bool)
+            keep[rows[rows < ntotal]] = False
+            cpu_index = self._cpu_index()
+            vectors = cpu_index.reconstruct_n(0, ntotal)[keep]
+            # Keeps the trained state (IVF centroids, SQ ranges)
+            index = faiss.clone_index(cpu_index)
+        
+        index = self._configure_index(index)
+        index.reset()
+        index.add(vectors)
+        
+        with self._lock:
+            if self._removals != removals:
+                logger.info("Vectors were deleted during compaction, starting over")
+                return
+            
+            # Catch up with vectors added meanwhile
+            if self.index.ntotal > ntotal:
+                index.add(self._cpu_index().reconstruct_n(ntotal, self.index.ntotal - ntotal))
+            self._swap_without_rows(index, rows)
+        
+        logger.info(f"Compacted FAISS index, dropped {rows.size} removed vectors")
+        # Renumbering invalidates the row numbers in the metadata log
+        self.save(compact=True)
+    
+    def _move_to_gpu(self):
+        """Copy the current CPU index to the GPU(s) if GPU search is enabled (lock must be held)."""
+        if not self.gpu or self.on_gpu:
+            return
+        
+        num_gpus = faiss.get_num_gpus()
+        if num_gpus == 0:
+            return
+        
+        try:
+            if num_gpus > 1:
+                index = faiss.index_cpu_to_all_gpus(self.index)
+            else:
+                if self._gpu_resources is None:
+                    self._gpu_resources = faiss.StandardGpuResources()
+                index = faiss.index_cpu_to_gpu(self._gpu_resources, 0, self.index)
+        except Exception as e:
+            logger.warning(f"Keeping {type(self.index).__name__} on the CPU: {str(e)}")
+            return
+        
+        self.index = index
+        self.on_gpu = True
+        # The GPU copy no longer reads from the memory-mapped file
+        self._read_only = False
+        logger.info(f"Moved FAISS index to {num_gpus} GPU(s)")
+    
+    def _cpu_index(self) -> faiss.Index:
+        """Get the index on the CPU, copying it back from the GPU if needed."""
+        if self.on_gpu:
+            return faiss.index_gpu_to_cpu(self.index)
+        return self.index
+    
+    def _invalidate_caches(self):
+        """Discard cached search results after the index changed (lock must be held)."""
+        self._version += 1
+    
+    def _claim_writer(self):
+        """
+        Take the exclusive writer lock on the index files before the first change (lock must be held).
+        
+        Every save rewrites the files from this process's memory and truncates
+        the metadata log, so a second process writing the same files would
+        discard the first one's unsaved changes.
+        
+        Raises:
+            RuntimeError: If another process is already writing the index
+        """
+        if self._writer_lock is not None or fcntl is None:
+            return
+        
+        os.makedirs(os.path.dirname(self.lock_path) or '.', exist_ok=True)
+        lock_file = open(self.lock_path, 'a')
+        try:
+            fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            lock_file.close()
+            raise RuntimeError(
+                f"FAISS index {self.index_path} is being written by another process; "
+                f"run a single worker process"
+            )
+        self._writer_lock = lock_file
+    
+    def _ensure_writable(self):
+        """Replace a read-only memory-mapped index with an in-memory copy before writing."""
+        self._claim_writer()
+        if self._read_only:
+            self.index = self._configure_index(faiss.read_index(self.index_path))
+            self._read_only = False
+            logger.info("Loaded memory-mapped FAISS index into memory for writing")
+            self._move_to_gpu()
+    
+    def _delete_rows(self, rows: np.ndarray):
+        """
+        Remove vectors from a flat index and their metadata rows (lock must be held).
+        
+        Flat storage compacts in place, shifting later vectors down, so the
+        remaining vectors keep their order and vector ID i is still row i of
+        both the index and the metadata.
+        
+        Args:
+            rows (np.ndarray): Vector IDs to delete
+        """
+        self._ensure_writable()
+        index = self._cpu_index()
+        index.remove_ids(faiss.IDSelectorBatch(rows[rows < index.ntotal]))
+        self._swap_without_rows(index, rows)
+    
+    def _swap_without_rows(self, index: faiss.Index, rows: np.ndarray):
+        """
+        Install an index that no longer holds the given rows and drop their metadata (lock must be held).
+        
+        Args:
+            index (faiss.Index): CPU index holding every other vector, in order
+            rows (np.ndarray): Vector IDs that were removed
+        """
+        self.metadata.drop(rows)
+        self.next_id = len(self.metadata)
+        self._tombstones = int(np.count_nonzero(self.metadata.removed))
+        self._removals += 1
+        self._index_dirty = True
+        
+        self.index = index
+        self._read_only = False
+        self.on_gpu = False
+        self._move_to_gpu()
+        self._invalidate_caches()
     
     def add_vector(self, embedding: np.ndarray, metadata: Dict[str, Any]) -> int:
         """
@@ -73,17 +858,23 @@ class FAISSIndex:
             int: Index ID of the added vector
         """
         try:
-            # Ensure embedding is 2D array
-            if embedding.ndim == 1:
-                embedding = embedding.reshape(1, -1)
+            with self._lock:
+                # Copy into a 2D float32 array and normalize to unit length
+                embedding = np.array(embedding, dtype=np.float32).reshape(1, -1)
+                faiss.normalize_L2(embedding)
             
-            # Add to index
-            self.index.add(embedding.astype(np.float32))
+                # Add to index
+                self._ensure_writable()
+                self.index.add(embedding)
+                self._index_dirty = True
+                self._maybe_rebuild()
             
-            # Store metadata - include the text content for direct retrieval
-            vector_id = self.next_id
-            self.metadata[str(vector_id)] = metadata
-            self.next_id += 1
+                # Store metadata - include the text content for direct retrieval
+                vector_id = self.next_id
+                self.metadata.append([metadata])
+                self._log(['add', vector_id, [self._wal_entry(metadata)]])
+                self.next_id += 1
+                self._invalidate_caches()
             
             logger.debug(f"Added vector {vector_id} for candidate {metadata.get('candidate_id')}")
             return vector_id
@@ -100,23 +891,60 @@ class FAISSIndex:
             embeddings (List[np.ndarray]): List of embedding vectors
             metadatas (List[Dict]): List of metadata dicts
             
+        Returns:
+            List[int]: List of vector IDs
+        """
+        # The stacked buffer is private, so it can be normalized in place
+        return self.add_vectors(stack_embeddings(embeddings), metadatas, copy=False)
+    
+    def add_vectors(self, matrix: np.ndarray, metadatas: List[Dict],
+                    copy: bool = True) -> List[int]:
+        """
+        Add a stacked (N, d) matrix of embeddings in a single index call.
+        
+        Args:
+            matrix (np.ndarray): 2D array with one embedding per row
+            metadatas (List[Dict]): Metadata dicts, one per row of the matrix
+            copy (bool): Normalize a copy, leaving matrix untouched. With False, a
+                         C-contiguous float32 matrix is normalized in place and
+                         handed to FAISS without any copy.
+            
         Returns:
             List[int]: List of vector IDs
         """
         try:
-            # Stack embeddings into 2D array
-            embeddings_array = np.vstack(embeddings).astype(np.float32)
+            if matrix.ndim == 1:
+                matrix = matrix.reshape(1, -1)
             
-            # Add to index
-            self.index.add(embeddings_array)
+            if matrix.shape[0] != len(metadatas):
+                raise ValueError(
+                    f"Got {matrix.shape[0]} vectors but {len(metadatas)} metadata entries"
+                )
             
-            # Store metadata
-            vector_ids = []
-            for metadata in metadatas:
-                vector_id = self.next_id
-                self.metadata[str(vector_id)] = metadata
-                vector_ids.append(vector_id)
-                self.next_id += 1
+            if matrix.shape[1] != EMBEDDING_DIM:
+                raise ValueError(f"Expected {EMBEDDING_DIM}-dimensional vectors, got {matrix.shape[1]}")
+            
+            if copy:
+                # Normalized copy, so the caller's array is left untouched
+                vectors = np.array(matrix, dtype=np.float32)
+            else:
+                # Only copies if matrix is not already C-contiguous float32
+                vectors = np.ascontiguousarray(matrix, dtype=np.float32)
+            faiss.normalize_L2(vectors)
+            
+            with self._lock:
+                # One contiguous add lets FAISS process the whole block at once
+                self._ensure_writable()
+                self.index.add(vectors)
+                self._index_dirty = True
+                self._maybe_rebuild()
+            
+                # Store metadata
+                vector_ids = list(range(self.next_id, self.next_id + len(metadatas)))
+                self.metadata.append(metadatas)
+                self._log(['add', self.next_id, [self._wal_entry(m) for m in metadatas]])
+                self.next_id += len(metadatas)
+                self._invalidate_caches()
             
             logger.info(f"Added batch of {len(vector_ids)} vectors")
             return vector_ids
@@ -125,54 +953,97 @@ class FAISSIndex:
             logger.error(f"Error adding batch: {str(e)}")
             raise
     
+    @staticmethod
+    def _wal_entry(metadata: Dict[str, Any]) -> Dict[str, Any]:
+        """Keep only the metadata fields ChunkMetadata stores."""
+        return {
+            'candidate_id': metadata.get('candidate_id') or '',
+            'chunk_type': metadata.get('chunk_type') or '',
+            'section': metadata.get('section') or '',
+            'text': metadata.get('text')
+        }
+    
+    def get_metadata(self, vector_id: int, include_text: bool = True) -> Dict[str, Any]:
+        """
+        Get the metadata dict of one vector.
+        
+        Args:
+            vector_id (int): Vector ID
+            include_text (bool): Include the chunk text
+            
+        Returns:
+            Dict: Metadata of the vector, or an empty dict for unknown IDs
+        """
+        with self._lock:
+            return self.metadata.get(int(vector_id), include_text)
+    
     def search(self, query_vector: np.ndarray, k: int = 5,
-               candidate_id: Optional[str] = None) -> List[Dict[str, Any]]:
+               candidate_id: Optional[str] = None,
+               include_text: bool = True) -> List[Dict[str, Any]]:
         """
         Search for nearest neighbors in the index.
         
         Args:
             query_vector (np.ndarray): Query embedding
             k (int): Number of results to return
-            candidate_id (Optional[str]): Filter results by candidate_id
+            candidate_id (Optional[str]): Only return vectors of this candidate. The
+                                          filter is applied inside the search, so up
+                                          to k of the candidate's chunks are returned.
+            include_text (bool): Include chunk texts in the result metadata
             
         Returns:
-            List[Dict]: List of search results with metadata and distances
+            List[Dict]: List of search results with metadata and cosine similarity
+                        scores ('score', higher is more similar)
         """
         try:
-            if self.index is None or self.index.ntotal == 0:
-                logger.warning("FAISS index is empty")
-                return []
-            
-            # Reshape query vector
-            if query_vector.ndim == 1:
-                query_vector = query_vector.reshape(1, -1)
-            
-            # Search
-            distances, indices = self.index.search(
-                query_vector.astype(np.float32),
-                min(k, self.index.ntotal)
-            )
+            query_key = hashlib.blake2b(
+                np.ascontiguousarray(query_vector, dtype=np.float32).tobytes(), digest_size=16
+            ).digest()
+            scope = (k, candidate_id, include_text, self._version)
             
-            # Filter and format results
-            results = []
-            for dist, idx in zip(distances[0], indices[0]):
-                if idx == -1:  # Invalid index
-                    continue
-                
-                metadata = self.metadata.get(str(idx), {})
-                
-                # Filter by candidate_id if specified
-                if candidate_id and metadata.get('candidate_id') != candidate_id:
-                    continue
+            if self._search_cache is not None:
+                cached = self._search_cache.get((query_key, scope))
+                if cached is not None:
+                    return cached
+            
+            # Normalize the query like the stored vectors
+            query = np.array(query_vector, dtype=np.float32).reshape(1, -1)
+            faiss.normalize_L2(query)
+            
+            with self._lock:
+                if self.index is None or self.index.ntotal == 0:
+                    logger.warning("FAISS index is empty")
+                    return []
+            
+                selector = None
+                if candidate_id:
+                    row_ids = self.metadata.rows_for_candidate(candidate_id)
+                    row_ids = row_ids[row_ids < self.index.ntotal]
+                    if row_ids.size == 0:
+                        return []
+                    
+                    # Few vectors: scoring them directly beats a filtered graph walk,
+                    # which can also stop short of k hits. GPU indexes take no selectors.
+                    if self.on_gpu or (row_ids.size <= EXACT_FILTER_MAX and not _is_ivf(self.index)):
+                        vectors = self._reconstruct_rows(row_ids)
+                        results = self._top_k(vectors @ query[0], row_ids, k, include_text)
+                    else:
+                        selector = faiss.IDSelectorBatch(row_ids)
                 
-                results.append({
-                    'vector_id': int(idx),
-                    'distance': float(dist),
-                    'metadata': metadata
-                })
+                if not candidate_id or selector is not None:
+                    # Search, restricted to the selected IDs when filtering; removed
+                    # rows still in the index are fetched extra and skipped
+                    k_search = min(k + self._tombstones, self.index.ntotal)
+                    scores, indices = self.index.search(
+                        query,
+                        k_search,
+                        params=self._search_params(k_search, selector)
+                    )
+                    
+                    results = self._format_results(indices[0], scores[0], include_text)[:k]
             
-            # Truncate to k results after filtering
-            results = results[:k]
+            if self._search_cache is not None:
+                self._search_cache.put((query_key, scope), results)
             
             logger.debug(f"Search returned {len(results)} results")
             return results
@@ -181,6 +1052,180 @@ class FAISSIndex:
             logger.error(f"Error searching index: {str(e)}")
             return []
     
+    def batch_search(self, query_matrix: np.ndarray, k: int = 5,
+                     candidate_id: Optional[str] = None,
+                     include_text: bool = True) -> List[List[Dict[str, Any]]]:
+        """
+        Search for the nearest neighbors of several queries in one index call.
+        
+        FAISS parallelizes a multi-row search across its OpenMP threads, which is
+        cheaper than calling search() once per query.
+        
+        Args:
+            query_matrix (np.ndarray): (N, d) matrix with one query embedding per row
+            k (int): Number of results to return per query
+            candidate_id (Optional[str]): Only return vectors of this candidate
+            include_text (bool): Include chunk texts in the result metadata
+            
+        Returns:
+            List[List[Dict]]: One result list per query row, same format as search()
+        """
+        try:
+            # Normalized copy, so the caller's array is left untouched
+            queries = np.array(query_matrix, dtype=np.float32).reshape(-1, EMBEDDING_DIM)
+            faiss.normalize_L2(queries)
+            
+            with self._lock:
+                if self.index is None or self.index.ntotal == 0 or queries.shape[0] == 0:
+                    return [[] for _ in range(queries.shape[0])]
+                
+                selector = None
+                if candidate_id:
+                    row_ids = self.metadata.rows_for_candidate(candidate_id)
+                    row_ids = row_ids[row_ids < self.index.ntotal]
+                    if row_ids.size == 0:
+                        return [[] for _ in range(queries.shape[0])]
+                    
+                    if self.on_gpu or (row_ids.size <= EXACT_FILTER_MAX and not _is_ivf(self.index)):
+                        vectors = self._reconstruct_rows(row_ids)
+                        # One SGEMM scores every query against the candidate's rows
+                        scores = queries @ vectors.T
+                        return [
+                            self._top_k(row_scores, row_ids, k, include_text)
+                            for row_scores in scores
+                        ]
+                    selector = faiss.IDSelectorBatch(row_ids)
+                
+                k_search = min(k + self._tombstones, self.index.ntotal)
+                scores, indices = self.index.search(
+                    queries,
+                    k_search,
+                    params=self._search_params(k_search, selector)
+                )
+                
+                return [
+                    self._format_results(row_indices, row_scores, include_text)[:k]
+                    for row_scores, row_indices in zip(scores, indices)
+                ]
+        
+        except Exception as e:
+            logger.error(f"Error in batch search: {str(e)}")
+            return [[] for _ in range(len(query_matrix))]
+    
+    def _search_params(self, k: int,
+                       selector: Optional[faiss.IDSelector] = None) -> Optional[faiss.SearchParameters]:
+        """
+        Build per-query search parameters.
+        
+        HNSW returns at most efSearch results, so efSearch is raised to k.
+        
+        Args:
+            k (int): Number of results requested
+            selector (Optional[faiss.IDSelector]): Restrict the search to these IDs
+            
+        Returns:
+            Optional[faiss.SearchParameters]: Parameters for the index type, or None
+                                              when the defaults apply
+        """
+        if getattr(self.index, 'hnsw', None) is not None:
+            return faiss.SearchParametersHNSW(efSearch=max(self.ef_search, k), sel=selector)
+        if selector is None:
+            return None
+        if _is_ivf(self.index):
+            return faiss.SearchParametersIVF(nprobe=self.nprobe, sel=selector)
+        return faiss.SearchParameters(sel=selector)
+    
+    def _top_k(self, scores: np.ndarray, row_ids: np.ndarray, k: int,
+               include_text: bool) -> List[Dict[str, Any]]:
+        """
+        Format the k best-scoring rows as search results.
+        
+        Args:
+            scores (np.ndarray): Cosine similarity of each row
+            row_ids (np.ndarray): Vector ID of each row
+            k (int): Number of results to return
+            include_text (bool): Include chunk texts in the result metadata
+            
+        Returns:
+            List[Dict]: Search results, best first
+        """
+        k = min(k, scores.shape[0])
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        
+        return self._format_results(row_ids[top], scores[top], include_text)
+    
+    def _format_results(self, vector_ids: np.ndarray, scores: np.ndarray,
+                        include_text: bool) -> List[Dict[str, Any]]:
+        """
+        Pair search hits with their metadata.
+        
+        IDs and scores are converted to Python numbers in one tolist() call
+        each, and the metadata columns are gathered once for all hits.
+        
+        Args:
+            vector_ids (np.ndarray): Vector ID of each hit; -1 marks empty slots
+            scores (np.ndarray): Cosine similarity of each hit
+            include_text (bool): Include chunk texts in the result metadata
+            
+        Returns:
+            List[Dict]: Search results in the order given, without removed rows
+        """
+        valid = vector_ids != -1
+        if self._tombstones:
+            valid &= ~self.metadata.removed[np.where(valid, vector_ids, 0)]
+        vector_ids = vector_ids[valid]
+        metadatas = self.metadata.get_many(vector_ids, include_text)
+        
+        return [
+            {'vector_id': vector_id, 'score': score, 'metadata': metadata}
+            for vector_id, score, metadata in zip(
+                vector_ids.tolist(), scores[valid].tolist(), metadatas
+            )
+        ]
+    
+    def matrix(self) -> np.ndarray:
+        """
+        Decode all stored vectors into one contiguous (N, d) float32 matrix.
+        
+        Row i holds vector ID i. For quantized index types the rows are the
+        decoded (approximate) vectors. This is a full copy of the index, so it
+        is only used to build the GPU CAGRA graph.
+        
+        Returns:
+            np.ndarray: Matrix of stored embeddings
+        """
+        with self._lock:
+            if self.index.ntotal == 0:
+                return np.empty((0, self.index.d), dtype=np.float32)
+            return np.ascontiguousarray(
+                self._cpu_index().reconstruct_n(0, self.index.ntotal), dtype=np.float32
+            )
+    
+    def _reconstruct_rows(self, row_ids: np.ndarray) -> np.ndarray:
+        """
+        Decode the stored vectors with the given IDs (lock must be held).
+        
+        GPU index types that cannot reconstruct by ID are copied back to the CPU
+        first; the copy of an IVF index gets its ID map rebuilt.
+        
+        Args:
+            row_ids (np.ndarray): Vector IDs
+            
+        Returns:
+            np.ndarray: (len(row_ids), d) matrix of embeddings
+        """
+        try:
+            return self.index.reconstruct_batch(row_ids)
+        except RuntimeError:
+            if not self.on_gpu:
+                raise
+            index = self._cpu_index()
+            ivf = faiss.try_extract_index_ivf(index)
+            if ivf is not None and ivf.direct_map.no():
+                ivf.make_direct_map()
+            return index.reconstruct_batch(row_ids)
+    
     def get_candidate_chunks(self, candidate_id: str) -> List[Dict[str, Any]]:
         """
         Get all indexed chunks for a specific candidate.
@@ -192,9 +1237,10 @@ class FAISSIndex:
             List[Dict]: List of chunks with their metadata
         """
         try:
-            chunks = []
-            for vector_id, metadata in self.metadata.items():
-                if metadata.get('candidate_id') == candidate_id:
+            with self._lock:
+                chunks = []
+                for vector_id in self.metadata.rows_for_candidate(candidate_id).tolist():
+                    metadata = self.metadata.get(vector_id)
                     chunks.append({
                         'vector_id': vector_id,
                         'chunk_type': metadata.get('chunk_type'),
@@ -208,48 +1254,160 @@ class FAISSIndex:
             logger.error(f"Error retrieving candidate chunks: {str(e)}")
             return []
     
-    def save(self):
-        """Save FAISS index and metadata to disk."""
+    def save(self, compact: bool = False):
+        """
+        Save FAISS index and metadata to disk.
+        
+        The index is serialized in memory under the lock, then written to
+        temporary files that atomically replace the previous ones, so readers
+        never see a half-written file and searches are not blocked on disk I/O.
+        
+        Metadata changes are already in the append-only log, so the metadata
+        file is only rewritten (and the log truncated) once the log exceeds
+        WAL_COMPACT_BYTES; otherwise a save just syncs the log. The index file
+        is skipped when no vectors were added since the last save.
+        
+        Args:
+            compact (bool): Rewrite the metadata file regardless of the log size
+        """
         try:
             os.makedirs(os.path.dirname(self.index_path) or '.', exist_ok=True)
             
-            # Save index
-            faiss.write_index(self.index, self.index_path)
-            
-            # Save metadata
-            with open(self.metadata_path, 'w') as f:
-                json.dump(self.metadata, f, indent=2)
+            with self._save_lock:
+                with self._lock:
+                    self._claim_writer()
+                    write_index = self._index_dirty or not os.path.exists(self.index_path)
+                    index_bytes = faiss.serialize_index(self._cpu_index()) if write_index else None
+                    self._index_dirty = False
+                    
+                    self._wal.flush()
+                    os.fsync(self._wal.fileno())
+                    wal_offset = self._wal.tell()
+                    compact = (
+                        compact
+                        or wal_offset > WAL_COMPACT_BYTES
+                        or not os.path.exists(self.metadata_path)
+                    )
+                    
+                    metadata_bytes = texts_bytes = None
+                    if compact:
+                        columns = self.metadata.to_columns()
+                        # Saved so loading does not have to derive it from the rows
+                        columns['next_id'] = self.next_id
+                        metadata_bytes = msgpack.packb(columns, use_bin_type=True)
+                        # Texts that were never loaded are unchanged on disk
+                        texts_bytes = (
+                            msgpack.packb(self.metadata.texts, use_bin_type=True)
+                            if self.metadata.texts_loaded else None
+                        )
+                
+                try:
+                    # Save index
+                    if index_bytes is not None:
+                        self._write_atomic(self.index_path, index_bytes.tobytes())
+                except Exception:
+                    self._index_dirty = True
+                    raise
+                
+                # Save metadata
+                if compact:
+                    if texts_bytes is not None:
+                        self._write_atomic(self.texts_path, texts_bytes)
+                    self._write_atomic(self.metadata_path, metadata_bytes)
+                    self._truncate_wal(wal_offset)
             
-            logger.info(f"Saved FAISS index and metadata to {self.index_path}")
+            logger.info(
+                f"Saved FAISS index to {self.index_path} "
+                f"(index written: {index_bytes is not None}, metadata compacted: {compact})"
+            )
         
         except Exception as e:
             logger.error(f"Error saving index: {str(e)}")
             raise
     
-    def delete_candidate(self, candidate_id: str):
+    def _truncate_wal(self, offset: int):
+        """
+        Drop the log records now contained in the metadata file.
+        
+        Args:
+            offset (int): Log size when the metadata snapshot was taken; records
+                          appended after it are kept
+        """
+        with self._lock:
+            with open(self.wal_path, 'rb') as f:
+                f.seek(offset)
+                tail = f.read()
+            self._wal.close()
+            self._write_atomic(self.wal_path, tail)
+            self._open_wal()
+    
+    @staticmethod
+    def _write_atomic(path: str, data: bytes):
+        """
+        Write data to a temporary file, fsync it and rename it over path.
+        
+        Args:
+            path (str): Destination file path
+            data (bytes): File contents
+        """
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, 'wb') as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+    
+    def delete_candidate(self, candidate_id: str) -> int:
         """
         Remove all vectors associated with a candidate.
-        Note: FAISS doesn't support deletion, so we mark as removed in metadata.
+        
+        A flat index drops the vectors right away. Graph and IVF indexes have to
+        be rebuilt without them, which takes time proportional to the index size,
+        so their rows are flagged as removed (and skipped by searches) until a
+        background compaction swaps in the rebuilt index. Either way, vector IDs
+        after the removed ones shift down once the vectors are gone.
         
         Args:
             candidate_id (str): The candidate's unique identifier
+            
+        Returns:
+            int: Number of vectors removed
         """
         try:
-            removed_count = 0
-            keys_to_remove = []
+            with self._lock:
+                rows = self.metadata.rows_for_candidate(candidate_id)
+                in_place = rows.size > 0 and isinstance(self.index, faiss.IndexFlat)
+                if in_place:
+                    self._delete_rows(rows)
+                elif rows.size:
+                    self._claim_writer()
+                    self.metadata.removed[rows] = True
+                    self._tombstones += int(rows.size)
+                    self._invalidate_caches()
+                    self._start_rebuild()
             
-            for vector_id, metadata in self.metadata.items():
-                if metadata.get('candidate_id') == candidate_id:
-                    metadata['removed'] = True
-                    keys_to_remove.append(vector_id)
-                    removed_count += 1
+            if in_place:
+                # Renumbering invalidates the row numbers in the metadata log,
+                # so write the full metadata file right away
+                self.save(compact=True)
             
-            logger.info(f"Marked {removed_count} vectors for candidate {candidate_id} as removed")
+            logger.info(f"Removed {rows.size} vectors for candidate {candidate_id}")
+            return int(rows.size)
         
         except Exception as e:
             logger.error(f"Error deleting candidate: {str(e)}")
             raise
     
+    def close(self):
+        """Close the metadata log and release the writer lock (unsaved changes are not saved)."""
+        with self._lock:
+            if self._wal is not None:
+                self._wal.close()
+                self._wal = None
+            if self._writer_lock is not None:
+                self._writer_lock.close()
+                self._writer_lock = None
+    
     def get_stats(self) -> Dict[str, Any]:
         """
         Get statistics about the FAISS index.
@@ -260,7 +1418,99 @@ class FAISSIndex:
         return {
             'total_vectors': self.index.ntotal if self.index else 0,
             'dimension': self.index.d if self.index else 0,
+            'index_factory': self.index_factory,
+            'index_type': type(self.index).__name__ if self.index else None,
+            'memory_mapped': self._read_only,
+            'on_gpu': self.on_gpu,
+            'ef_search': self.ef_search,
+            'nprobe': self.nprobe,
+            'large_index_factory': self.large_index_factory,
+            'rebuilding': self._rebuild_thread is not None,
+            'pending_removals': self._tombstones,
             'metadata_entries': len(self.metadata),
             'index_path': self.index_path,
-            'metadata_path': self.metadata_path
+            'metadata_path': self.metadata_path,
+            'wal_path': self.wal_path,
+            'wal_bytes': self._wal.tell() if self._wal else 0,
+            'texts_path': self.texts_path
         }
+
+
+class IndexPersister:
+    """Save a FAISSIndex from a background thread, coalescing frequent writes."""
+    
+    def __init__(self, faiss_index: FAISSIndex, interval: float = 5.0, max_pending: int = 20):
+        """
+        Initialize the persister.
+        
+        Args:
+            faiss_index (FAISSIndex): Index to persist
+            interval (float): Maximum seconds between a change and its save
+            max_pending (int): Save immediately once this many changes are queued
+        """
+        self.faiss_index = faiss_index
+        self.interval = interval
+        self.max_pending = max_pending
+        self._queue: "queue.Queue[bool]" = queue.Queue()
+        self._thread: Optional[threading.Thread] = None
+        self._dirty = False
+        # Held while saving so flush() waits for an in-progress background save
+        self._save_lock = threading.Lock()
+    
+    def start(self):
+        """Start the background writer thread."""
+        if self._thread is None:
+            self._thread = threading.Thread(
+                target=self._run, name='faiss-persister', daemon=True
+            )
+            self._thread.start()
+    
+    def mark_dirty(self):
+        """Record that the index changed and needs to be saved."""
+        self._dirty = True
+        self._queue.put(True)
+    
+    def flush(self):
+        """Save pending changes synchronously (e.g. at shutdown)."""
+        while True:
+            try:
+                self._queue.get_nowait()
+            except queue.Empty:
+                break
+        self._save()
+    
+    def _save(self):
+        """Save the index if it has unsaved changes."""
+        with self._save_lock:
+            if not self._dirty:
+                return
+            self._dirty = False
+            try:
+                self.faiss_index.save()
+            except Exception:
+                # Keep the changes pending so the next save retries them
+                self._dirty = True
+                raise
+    
+    def _run(self):
+        """Wait for changes, then save at most once per interval or max_pending changes."""
+        while True:
+            self._queue.get()
+            pending = 1
+            deadline = time.monotonic() + self.interval
+            
+            while pending < self.max_pending:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    self._queue.get(timeout=remaining)
+                    pending += 1
+                except queue.Empty:
+                    break
+            
+            try:
+                self._save()
+                logger.debug(f"Persisted FAISS index after {pending} change(s)")
+            except Exception as e:
+                logger.error(f"Background FAISS save failed: {str(e)}")
@@ -0,0 +1,203 @@
+"""
+Optional GPU search backend using cuVS CAGRA.
+Builds a CAGRA graph from the vectors of a FAISSIndex and answers concurrent
+queries in batches, one kernel launch per batch. Falls back to the CPU index
+when CUDA / cuVS is not available or the corpus is small.
+"""
+
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from typing import Optional, List, Dict, Any, Tuple
+import numpy as np
+import logging
+
+from services.faiss_index import FAISSIndex
+
+logger = logging.getLogger(__name__)
+
+try:
+    import cupy as cp
+    from cuvs.neighbors import cagra
+except ImportError:  # cuVS is optional and only useful on CUDA hosts
+    cp = None
+    cagra = None
+
+
+def gpu_available() -> bool:
+    """
+    Check whether cuVS and a CUDA device can be used.
+    
+    Returns:
+        bool: True if CAGRA search can run on this host
+    """
+    if cagra is None:
+        return False
+    try:
+        return cp.cuda.runtime.getDeviceCount() > 0
+    except Exception:
+        return False
+
+
+class CagraIndex:
+    """Serve FAISSIndex searches from a GPU CAGRA graph with query batching."""
+    
+    def __init__(self, faiss_index: FAISSIndex, min_vectors: int = 10000,
+                 batch_window: float = 0.005, max_batch: int = 64, graph_degree: int = 32):
+        """
+        Initialize the CAGRA backend.
+        
+        Args:
+            faiss_index (FAISSIndex): CPU index that owns the vectors and metadata
+            min_vectors (int): Below this corpus size searches stay on the CPU index
+            batch_window (float): Seconds to wait for more queries before launching a batch
+            max_batch (int): Maximum number of queries per kernel launch
+            graph_degree (int): CAGRA graph degree
+        """
+        if not gpu_available():
+            raise RuntimeError("cuVS CAGRA requires the cuvs package and a CUDA device")
+        
+        self.faiss_index = faiss_index
+        self.min_vectors = min_vectors
+        self.batch_window = batch_window
+        self.max_batch = max_batch
+        self.graph_degree = graph_degree
+        
+        # (graph, (vector count, deletion count) it was built from), swapped in as one
+        # object so the search thread never sees a graph with the wrong key
+        self._graph: Optional[Tuple[Any, Tuple[int, int]]] = None
+        # Builds a new graph while searches keep using the current one
+        self._build_thread: Optional[threading.Thread] = None
+        self._build_lock = threading.Lock()
+        self._queue: "queue.Queue[Tuple[np.ndarray, int, Future]]" = queue.Queue()
+        self._thread = threading.Thread(target=self._run, name='cagra-search', daemon=True)
+        self._thread.start()
+    
+    def __getattr__(self, name: str) -> Any:
+        """Delegate everything except search to the CPU index."""
+        if name == 'faiss_index':
+            raise AttributeError(name)
+        return getattr(self.faiss_index, name)
+    
+    def search(self, query_vector: np.ndarray, k: int = 5,
+               candidate_id: Optional[str] = None,
+               include_text: bool = True) -> List[Dict[str, Any]]:
+        """
+        Search for nearest neighbors, batching concurrent queries on the GPU.
+        
+        Args:
+            query_vector (np.ndarray): Query embedding
+            k (int): Number of results to return
+            candidate_id (Optional[str]): Filter results by candidate_id
+            include_text (bool): Include chunk texts in the result metadata
+        
+        Returns:
+            List[Dict]: Search results in the same format as FAISSIndex.search()
+        """
+        ntotal = self.faiss_index.index.ntotal
+        if candidate_id or ntotal < self.min_vectors:
+            # Scoped or small searches are cheaper on the CPU
+            return self.faiss_index.search(
+                query_vector, k=k, candidate_id=candidate_id, include_text=include_text
+            )
+        
+        future: Future = Future()
+        query = np.array(query_vector, dtype=np.float32).reshape(-1)
+        norm = np.linalg.norm(query)
+        if norm > 0:
+            query /= norm
+        # Removed rows stay in the graph until the index is compacted
+        self._queue.put((query, min(k + self.faiss_index._tombstones, ntotal), future))
+        
+        try:
+            hits = future.result()
+        except Exception as e:
+            logger.error(f"CAGRA search failed, using CPU index: {str(e)}")
+            hits = None
+        
+        if hits is not None:
+            scores, indices, removals = hits
+            with self.faiss_index._lock:
+                # Vector IDs are only valid while no deletion has renumbered them
+                if self.faiss_index._removals == removals:
+                    return self.faiss_index._format_results(indices, scores, include_text)[:k]
+        
+        # No graph yet, or one from before the last deletion
+        return self.faiss_index.search(query_vector, k=k, include_text=include_text)
+    
+    def _current_graph(self) -> Optional[Tuple[Any, Tuple[int, int]]]:
+        """
+        Get the newest CAGRA graph, starting a background rebuild if the index changed.
+        
+        Returns:
+            Optional[Tuple]: (graph, key) to search, or None until the first build finishes
+        """
+        faiss_index = self.faiss_index
+        # Deletions renumber vectors, so an equal size alone does not mean unchanged
+        key = (faiss_index.index.ntotal, faiss_index._removals)
+        graph = self._graph
+        if graph is None or graph[1] != key:
+            with self._build_lock:
+                if self._build_thread is None:
+                    self._build_thread = threading.Thread(
+                        target=self._build_graph, name='cagra-build', daemon=True
+                    )
+                    self._build_thread.start()
+        return graph
+    
+    def _build_graph(self):
+        """Build a CAGRA graph from the current vectors and swap it in."""
+        try:
+            with self.faiss_index._lock:
+                key = (self.faiss_index.index.ntotal, self.faiss_index._removals)
+                dataset = self.faiss_index.matrix()
+            
+            build_params = cagra.IndexParams(metric='inner_product', graph_degree=self.graph_degree)
+            self._graph = (cagra.build(build_params, cp.asarray(dataset)), key)
+            logger.info(f"Built CAGRA graph over {dataset.shape[0]} vectors")
+        
+        except Exception as e:
+            logger.error(f"Error building CAGRA graph: {str(e)}")
+        
+        finally:
+            with self._build_lock:
+                self._build_thread = None
+    
+    def _run(self):
+        """Collect queries for up to batch_window seconds and search them in one launch."""
+        search_params = cagra.SearchParams()
+        
+        while True:
+            batch = [self._queue.get()]
+            deadline = time.monotonic() + self.batch_window
+            
+            while len(batch) < self.max_batch:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self._queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+            
+            try:
+                graph = self._current_graph()
+                if graph is None:
+                    for _, _, future in batch:
+                        future.set_result(None)
+                    continue
+                
+                graph, (_, removals) = graph
+                queries = cp.asarray(np.stack([query for query, _, _ in batch]))
+                k_max = max(k for _, k, _ in batch)
+                distances, neighbors = cagra.search(search_params, graph, queries, k_max)
+                distances = cp.asnumpy(cp.asarray(distances))
+                neighbors = cp.asnumpy(cp.asarray(neighbors))
+                
+                for row, (_, k, future) in enumerate(batch):
+                    future.set_result((distances[row, :k], neighbors[row, :k], removals))
+            
+            except Exception as e:
+                for _, _, future in batch:
+                    future.set_exception(e)
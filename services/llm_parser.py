@@ -1,31 +1,54 @@
 """
 LLM-based CV parser for extracting structured information.
-Uses OpenAI function calling to parse CV text into structured JSON.
+Uses OpenAI function calling (or, for short CVs, a smaller model with
+structured outputs) to parse CV text into structured JSON.
 """
 
+import hashlib
 import json
 import os
-from typing import Dict, Any, Optional
-from openai import OpenAI
+import re
+from typing import Dict, Any, Optional, Tuple
+from services.openai_client import create_openai_client
+import logging
+
+logger = logging.getLogger(__name__)
+
+EMAIL_RE = re.compile(r'[\w.\-]+@[\w.\-]+\.\w+')
+PHONE_RE = re.compile(r'(\+?\d{1,3}[-.\s]?)?\(?\d{3}\)?[-.\s]?\d{3}[-.\s]?\d{4}')
+# A line mentioning one of these words starts a new section in the fallback parser
+SECTION_RE = re.compile(
+    r'\b(summary|objective|skills|interests|hobbies|activities|experience|education|projects|certifications)\b',
+    re.I
+)
+SECTION_ALIASES = {'objective': 'summary', 'hobbies': 'interests', 'activities': 'interests'}
+DELIMITER_RE = re.compile(r'[,;|]')
 
 
 class LLMParser:
     """Parse CV text into structured data using LLM function calling."""
     
-    def __init__(self, api_key: Optional[str] = None, model: str = "gpt-4-turbo"):
+    def __init__(self, api_key: Optional[str] = None, model: str = "gpt-4-turbo",
+                 fast_model: Optional[str] = "gpt-4o-mini", fast_max_chars: int = 12000):
         """
         Initialize the LLM parser.
         
         Args:
             api_key (Optional[str]): OpenAI API key. Uses OPENAI_API_KEY env var if not provided.
             model (str): OpenAI model to use (default: gpt-4-turbo)
+            fast_model (Optional[str]): Smaller model tried first for CVs shorter than
+                                        fast_max_chars, with schema-constrained output.
+                                        None always uses model.
+            fast_max_chars (int): Longest CV text sent to fast_model
         """
         self.api_key = api_key or os.getenv('OPENAI_API_KEY')
         if not self.api_key:
             raise ValueError("OPENAI_API_KEY environment variable not set")
         
-        self.client = OpenAI(api_key=self.api_key)
+        self.client = create_openai_client(self.api_key)
         self.model = model
+        self.fast_model = fast_model
+        self.fast_max_chars = fast_max_chars
     
     def parse(self, cv_text: str) -> Dict[str, Any]:
         """
@@ -37,43 +60,172 @@ class LLMParser:
         Returns:
             Dict[str, Any]: Structured CV data with fixed JSON schema
         """
+        return self.parse_with_source(cv_text)[0]
+    
+    def parse_with_source(self, cv_text: str) -> Tuple[Dict[str, Any], bool]:
+        """
+        Parse CV text and report whether an LLM produced the result.
+        
+        Short CVs are first parsed by fast_model with a strict JSON schema; if
+        that fails or misses a required field, model parses it with function
+        calling. If model returns no tool call, the heuristic _default_parse()
+        is used instead.
+        
+        Args:
+            cv_text (str): Raw extracted CV text
+            
+        Returns:
+            Tuple[Dict[str, Any], bool]: Structured CV data, and False when it
+                                         came from the heuristic fallback
+        """
+        if self.fast_model and len(cv_text) < self.fast_max_chars:
+            try:
+                parsed_data = self._parse_structured(cv_text)
+                if self._is_complete(parsed_data):
+                    return parsed_data, True
+                logger.info(f"{self.fast_model} parse missed required fields, retrying with {self.model}")
+            except Exception as e:
+                logger.warning(f"{self.fast_model} parse failed, retrying with {self.model}: {str(e)}")
+        
         try:
-            response = self.client.chat.completions.create(
+            stream = self.client.chat.completions.create(
                 model=self.model,
-                messages=[
-                    {
-                        "role": "system",
-                        "content": """You are a CV parsing expert. Extract ALL information from CVs and return structured JSON.
-                        Be thorough and extract everything mentioned in the CV:
-                        - Extract ALL work experience entries
-                        - Extract ALL projects mentioned
-                        - Extract ALL education entries
-                        - Extract ALL certifications and credentials
-                        - Extract ALL skills listed
-                        - Do not omit or summarize any information
-                        - If information is not present, use empty arrays or null values appropriately"""
-                    },
-                    {
-                        "role": "user",
-                        "content": f"Parse this CV completely and extract ALL information:\n\n{cv_text}"
-                    }
-                ],
+                messages=self._get_messages(cv_text),
                 tools=[{"type": "function", "function": self._get_cv_schema()}],
-                tool_choice={"type": "function", "function": {"name": "parse_cv"}}
+                tool_choice={"type": "function", "function": {"name": "parse_cv"}},
+                stream=True
             )
             
+            # Collect the tool call's JSON arguments as they are generated, instead
+            # of waiting for the whole response object to be built
+            arguments = []
+            for chunk in stream:
+                if not chunk.choices or not chunk.choices[0].delta.tool_calls:
+                    continue
+                for tool_call in chunk.choices[0].delta.tool_calls:
+                    if tool_call.index == 0 and tool_call.function and tool_call.function.arguments:
+                        arguments.append(tool_call.function.arguments)
+            
             # Extract tool call result
-            if response.choices[0].message.tool_calls:
-                tool_call = response.choices[0].message.tool_calls[0]
-                parsed_data = json.loads(tool_call.function.arguments)
-                return parsed_data
+            if arguments:
+                parsed_data = json.loads(''.join(arguments))
+                return parsed_data, True
             else:
                 # Fallback if no tool call
-                return self._default_parse(cv_text)
+                logger.warning(f"{self.model} returned no tool call, using heuristic parse")
+                return self._default_parse(cv_text), False
         
         except Exception as e:
             raise ValueError(f"Error parsing CV with LLM: {str(e)}")
     
+    def _parse_structured(self, cv_text: str) -> Dict[str, Any]:
+        """
+        Parse CV text with fast_model using JSON-schema structured output.
+        
+        Args:
+            cv_text (str): Raw extracted CV text
+            
+        Returns:
+            Dict[str, Any]: Structured CV data
+        """
+        response = self.client.chat.completions.create(
+            model=self.fast_model,
+            messages=self._get_messages(cv_text),
+            response_format={
+                "type": "json_schema",
+                "json_schema": {
+                    "name": "parse_cv",
+                    "schema": self._strict_schema(self._get_cv_schema()["parameters"]),
+                    "strict": True
+                }
+            }
+        )
+        return json.loads(response.choices[0].message.content)
+    
+    @staticmethod
+    def _is_complete(parsed_data: Dict[str, Any]) -> bool:
+        """Check that a parse result has the schema's required fields."""
+        return (
+            isinstance(parsed_data.get("name"), str) and bool(parsed_data["name"].strip())
+            and isinstance(parsed_data.get("email"), str)
+            and isinstance(parsed_data.get("skills"), list)
+        )
+    
+    @classmethod
+    def _strict_schema(cls, schema: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Convert a JSON schema to the form strict structured output accepts.
+        
+        Strict mode requires every property of every object to be listed as
+        required and additional properties to be disallowed.
+        
+        Args:
+            schema (Dict): JSON schema
+            
+        Returns:
+            Dict: Strict copy of the schema
+        """
+        strict = dict(schema)
+        if "properties" in strict:
+            strict["properties"] = {
+                name: cls._strict_schema(prop) for name, prop in strict["properties"].items()
+            }
+            strict["required"] = list(strict["properties"])
+            strict["additionalProperties"] = False
+        if "items" in strict:
+            strict["items"] = cls._strict_schema(strict["items"])
+        return strict
+    
+    @staticmethod
+    def _get_messages(cv_text: str) -> list:
+        """
+        Build the chat messages asking the model to parse a CV.
+        
+        Args:
+            cv_text (str): Raw extracted CV text
+            
+        Returns:
+            list: System and user messages
+        """
+        return [
+            {
+                "role": "system",
+                "content": """You are a CV parsing expert. Extract ALL information from CVs and return structured JSON.
+                Be thorough and extract everything mentioned in the CV:
+                - Extract ALL work experience entries
+                - Extract ALL projects mentioned
+                - Extract ALL education entries
+                - Extract ALL certifications and credentials
+                - Extract ALL skills listed
+                - Do not omit or summarize any information
+                - If information is not present, use empty arrays or null values appropriately"""
+            },
+            {
+                "role": "user",
+                "content": f"Parse this CV completely and extract ALL information:\n\n{cv_text}"
+            }
+        ]
+    
+    def text_hash(self, cv_text: str) -> str:
+        """
+        Hash a CV text for parse-result caching.
+        
+        The key names the models parse() uses for this text, so results of
+        fast_model and of model never share a key, and changing fast_model or
+        fast_max_chars invalidates the affected entries.
+        
+        Args:
+            cv_text (str): Raw extracted CV text
+            
+        Returns:
+            str: Hex SHA-256 digest of the model names and the text
+        """
+        models = self.model
+        if self.fast_model and len(cv_text) < self.fast_max_chars:
+            # Parsed by fast_model first, with model as the fallback
+            models = f"{self.fast_model},{self.model}"
+        return hashlib.sha256(f"{models}\n{cv_text}".encode('utf-8')).hexdigest()
+    
     def _get_cv_schema(self) -> Dict[str, Any]:
         """
         Define the CV schema for function calling.
@@ -176,97 +328,59 @@ class LLMParser:
         """
         Fallback parsing logic if LLM function calling fails.
         
+        Walks the lines once, using SECTION_RE to track which section each
+        line belongs to, then post-processes the collected sections.
+        
         Args:
             cv_text (str): Raw CV text
             
         Returns:
             Dict[str, Any]: Partially parsed CV data
         """
-        # Simple fallback parsing
-        lines = cv_text.split("\n")
+        name = "Unknown"
+        sections = {}
+        current_section = None
+        
+        for line in cv_text.split("\n"):
+            stripped = line.strip()
+            if not stripped:
+                continue
+            
+            if name == "Unknown" and len(stripped) < 100:
+                name = stripped
+            
+            match = SECTION_RE.search(stripped)
+            if match:
+                current_section = SECTION_ALIASES.get(match.group(1).lower(), match.group(1).lower())
+                sections.setdefault(current_section, [])
+                continue
+            
+            if current_section is not None:
+                sections[current_section].append(stripped)
+        
+        email = EMAIL_RE.search(cv_text)
+        phone = PHONE_RE.search(cv_text)
         
         return {
-            "name": self._extract_name(lines),
-            "email": self._extract_email(cv_text),
-            "phone": self._extract_phone(cv_text),
-            "summary": self._extract_summary(lines),
-            "skills": self._extract_skills(lines),
+            "name": name,
+            "email": email.group(0) if email else "",
+            "phone": phone.group(0) if phone else "",
+            "summary": " ".join(sections.get("summary", [])[:4]),
+            "skills": self._split_items(sections.get("skills", [])),
             "experience": [],
             "education": [],
             "projects": [],
             "certifications": [],
-            "interests": self._extract_interests(lines)
+            "interests": self._split_items(sections.get("interests", []), min_length=3)
         }
     
-    def _extract_name(self, lines: list) -> str:
-        """Extract candidate name from first non-empty line."""
-        for line in lines:
-            if line.strip() and len(line.strip()) < 100:
-                return line.strip()
-        return "Unknown"
-    
-    def _extract_email(self, text: str) -> str:
-        """Extract email address from text."""
-        import re
-        match = re.search(r'[\w\.-]+@[\w\.-]+\.\w+', text)
-        return match.group(0) if match else ""
-    
-    def _extract_phone(self, text: str) -> str:
-        """Extract phone number from text."""
-        import re
-        match = re.search(r'(\+?\d{1,3}[-.\s]?)?\(?\d{3}\)?[-.\s]?\d{3}[-.\s]?\d{4}', text)
-        return match.group(0) if match else ""
-    
-    def _extract_summary(self, lines: list) -> str:
-        """Extract professional summary."""
-        for i, line in enumerate(lines):
-            if 'summary' in line.lower() or 'objective' in line.lower():
-                # Return next few non-empty lines
-                summary_lines = []
-                for j in range(i + 1, min(i + 5, len(lines))):
-                    if lines[j].strip():
-                        summary_lines.append(lines[j].strip())
-                return " ".join(summary_lines)
-        return ""
-    
-    def _extract_skills(self, lines: list) -> list:
-        """Extract skills section."""
-        skills = []
-        in_skills_section = False
-        
+    @staticmethod
+    def _split_items(lines: list, min_length: int = 1) -> list:
+        """Split section lines on common delimiters into a flat list of items."""
+        items = []
         for line in lines:
-            if 'skills' in line.lower():
-                in_skills_section = True
-                continue
-            
-            if in_skills_section:
-                if any(keyword in line.lower() for keyword in ['experience', 'education', 'projects']):
-                    break
-                
-                if line.strip():
-                    # Split by common delimiters
-                    skill_items = [s.strip() for s in line.replace(',', '|').replace(';', '|').split('|')]
-                    skills.extend([s for s in skill_items if s])
-        
-        return skills    
-    def _extract_interests(self, lines: list) -> list:
-        """Extract interests and hobbies section."""
-        interests = []
-        in_interests_section = False
-        
-        for line in lines:
-            line_lower = line.lower()
-            if any(keyword in line_lower for keyword in ['interests', 'hobbies', 'personal interests', 'activities']):
-                in_interests_section = True
-                continue
-            
-            if in_interests_section:
-                if any(keyword in line_lower for keyword in ['experience', 'education', 'projects', 'skills', 'certifications']):
-                    break
-                
-                if line.strip():
-                    # Split by common delimiters
-                    interest_items = [s.strip() for s in line.replace(',', '|').replace(';', '|').split('|')]
-                    interests.extend([s for s in interest_items if s and len(s) > 2])
-        
-        return interests
\ No newline at end of file
+            for item in DELIMITER_RE.split(line):
+                item = item.strip()
+                if len(item) >= min_length:
+                    items.append(item)
+        return items
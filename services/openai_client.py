@@ -0,0 +1,60 @@
+"""
+Shared OpenAI client factory.
+All OpenAI-backed services send their requests through one process-wide
+httpx connection pool, so TLS sessions are reused across API calls.
+
+openai and httpx (with pydantic behind them) are imported on first use, so
+processes that never call the API do not pay for loading them.
+"""
+
+import threading
+from typing import Optional, TYPE_CHECKING
+
+if TYPE_CHECKING:
+    import httpx
+    from openai import OpenAI
+
+# Connection pool settings for api.openai.com
+MAX_CONNECTIONS = 100
+MAX_KEEPALIVE_CONNECTIONS = 20
+KEEPALIVE_EXPIRY = 30.0
+
+_http_client: Optional["httpx.Client"] = None
+_lock = threading.Lock()
+
+
+def get_http_client() -> "httpx.Client":
+    """
+    Return the shared HTTP/2 client, creating it on first use.
+    
+    Returns:
+        httpx.Client: Keep-alive client shared by all OpenAI clients
+    """
+    global _http_client
+    if _http_client is None:
+        with _lock:
+            if _http_client is None:
+                import httpx
+                _http_client = httpx.Client(
+                    http2=True,
+                    limits=httpx.Limits(
+                        max_connections=MAX_CONNECTIONS,
+                        max_keepalive_connections=MAX_KEEPALIVE_CONNECTIONS,
+                        keepalive_expiry=KEEPALIVE_EXPIRY
+                    )
+                )
+    return _http_client
+
+
+def create_openai_client(api_key: str) -> "OpenAI":
+    """
+    Create an OpenAI client that uses the shared connection pool.
+    
+    Args:
+        api_key (str): OpenAI API key
+    
+    Returns:
+        OpenAI: Client whose requests reuse pooled connections
+    """
+    from openai import OpenAI
+    return OpenAI(api_key=api_key, http_client=get_http_client())
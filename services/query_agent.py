@@ -3,18 +3,28 @@ Query agent for orchestrating RAG pipeline.
 Combines LLM, semantic search, and database operations to answer questions.
 """
 
+import json
 import os
-from typing import Optional, Dict, Any, List
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional, Dict, Any, List, Iterator
 import numpy as np
-from openai import OpenAI
+from services.openai_client import create_openai_client
 import logging
 
 logger = logging.getLogger(__name__)
 
+# Worker threads for LLM calls that run alongside the RAG pipeline
+_executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix='query')
+
 
 class QueryAgent:
     """Orchestrate RAG pipeline for answering questions about CVs."""
     
+    NO_CONTEXT_ANSWER = "No relevant information found in the CV database."
+    LOW_CONFIDENCE_ANSWER = (
+        "Not enough relevant information was found in the CV database to answer this question."
+    )
+    
     def __init__(self, db_repo, faiss_index, embedding_service, 
                  api_key: Optional[str] = None, model: str = "gpt-4-turbo"):
         """
@@ -35,11 +45,13 @@ class QueryAgent:
         if not self.api_key:
             raise ValueError("OPENAI_API_KEY environment variable not set")
         
-        self.client = OpenAI(api_key=self.api_key)
+        self.client = create_openai_client(self.api_key)
         self.model = model
     
     def answer_question(self, question: str, candidate_id: Optional[str] = None,
-                       top_k: int = 10) -> Dict[str, Any]:
+                       top_k: int = 10,
+                       question_embedding: Optional[np.ndarray] = None,
+                       with_filters: bool = False, strict: bool = False) -> Dict[str, Any]:
         """
         Answer a question using RAG pipeline.
         
@@ -47,59 +59,58 @@ class QueryAgent:
             question (str): User's question
             candidate_id (Optional[str]): Scope search to specific candidate
             top_k (int): Number of context chunks to retrieve (default: 10)
+            question_embedding (Optional[np.ndarray]): Precomputed question embedding,
+                                                      skips the embedding API call
+            with_filters (bool): Also return the structured filters from extract_filters()
+            strict (bool): Answer low-confidence retrievals with a canned reply instead
+                           of calling the LLM
+            
+        Returns:
+            Dict: Answer, context, sources, and confidence (plus filters if requested)
+        """
+        # Filter extraction does not depend on the search, so its LLM round-trip
+        # runs on a worker thread while the question is embedded and answered
+        filters_future = _executor.submit(self.extract_filters, question) if with_filters else None
+        
+        answer_data = self._answer(question, candidate_id, top_k, question_embedding, strict)
+        
+        if filters_future is not None:
+            answer_data['filters'] = filters_future.result()
+        return answer_data
+    
+    def _answer(self, question: str, candidate_id: Optional[str], top_k: int,
+                question_embedding: Optional[np.ndarray], strict: bool) -> Dict[str, Any]:
+        """
+        Run the embed, search, and generate steps of the RAG pipeline.
+        
+        Args:
+            question (str): User's question
+            candidate_id (Optional[str]): Scope search to specific candidate
+            top_k (int): Number of context chunks to retrieve
+            question_embedding (Optional[np.ndarray]): Precomputed question embedding
+            strict (bool): Skip the LLM for low-confidence retrievals
             
         Returns:
             Dict: Answer, context, sources, and confidence
         """
         try:
-            # Step 1: Generate embedding for question
-            logger.info(f"Processing question: {question[:50]}...")
-            question_embedding = self.embedding_service.embed(question)
-            
-            # Step 2: Retrieve relevant context from FAISS (fetch more than needed)
-            # Request extra results in case filtering reduces the count
-            search_k = max(top_k, 15)
-            search_results = self.faiss_index.search(
-                question_embedding,
-                k=search_k,
-                candidate_id=candidate_id
-            )
-            
-            # If no results and we have a candidate_id, try again without filtering
-            if not search_results and candidate_id:
-                logger.info(f"No results for candidate {candidate_id}, trying across all candidates")
-                search_results = self.faiss_index.search(
-                    question_embedding,
-                    k=search_k
-                )
-            
-            if not search_results:
-                logger.warning("No relevant context found in FAISS index")
+            prepared = self._prepare_context(question, candidate_id, top_k, question_embedding)
+            if prepared is None:
                 return {
-                    'answer': "No relevant information found in the CV database.",
+                    'answer': self.NO_CONTEXT_ANSWER,
                     'context': [],
                     'sources': [],
                     'confidence': 'low'
                 }
             
-            # Step 3: Format context for LLM
-            context_text = self._format_context(search_results[:top_k])
-            sources = self._extract_sources(search_results[:top_k])
+            # Step 4: Generate answer using LLM, unless the context cannot support one
+            answer = self._canned_answer(prepared, strict)
+            if answer is None:
+                answer = self._generate_answer(question, prepared['context'])
             
-            # Step 4: Generate answer using LLM
-            answer = self._generate_answer(question, context_text)
+            logger.info(f"Generated answer with confidence: {prepared['confidence']}")
             
-            # Step 5: Determine confidence
-            confidence = self._evaluate_confidence(search_results[:top_k])
-            
-            logger.info(f"Generated answer with confidence: {confidence}")
-            
-            return {
-                'answer': answer,
-                'context': context_text,
-                'sources': sources,
-                'confidence': confidence
-            }
+            return {'answer': answer, **prepared}
         
         except Exception as e:
             logger.error(f"Error answering question: {str(e)}")
@@ -110,6 +121,119 @@ class QueryAgent:
                 'confidence': 'error'
             }
     
+    def stream_answer(self, question: str, candidate_id: Optional[str] = None,
+                      top_k: int = 10,
+                      question_embedding: Optional[np.ndarray] = None,
+                      strict: bool = False) -> Iterator[Dict[str, Any]]:
+        """
+        Answer a question using the RAG pipeline, streaming the answer as it is generated.
+        
+        Yields one 'context' event (context, sources, confidence) as soon as
+        retrieval is done, then 'token' events with pieces of the answer text,
+        then a final 'done' event. Failures end the stream with an 'error' event.
+        
+        Args:
+            question (str): User's question
+            candidate_id (Optional[str]): Scope search to specific candidate
+            top_k (int): Number of context chunks to retrieve (default: 10)
+            question_embedding (Optional[np.ndarray]): Precomputed question embedding,
+                                                      skips the embedding API call
+            strict (bool): Answer low-confidence retrievals with a canned reply instead
+                           of calling the LLM
+            
+        Yields:
+            Dict: Events with an 'event' key of context, token, done, or error
+        """
+        try:
+            prepared = self._prepare_context(question, candidate_id, top_k, question_embedding)
+            if prepared is None:
+                yield {'event': 'context', 'context': [], 'sources': [], 'confidence': 'low'}
+                yield {'event': 'token', 'text': self.NO_CONTEXT_ANSWER}
+            else:
+                yield {'event': 'context', **prepared}
+                answer = self._canned_answer(prepared, strict)
+                if answer is not None:
+                    yield {'event': 'token', 'text': answer}
+                else:
+                    for text in self._stream_answer(question, prepared['context']):
+                        yield {'event': 'token', 'text': text}
+            
+            yield {'event': 'done'}
+        
+        except Exception as e:
+            logger.error(f"Error streaming answer: {str(e)}")
+            yield {'event': 'error', 'message': str(e)}
+    
+    def _canned_answer(self, prepared: Dict[str, Any], strict: bool) -> Optional[str]:
+        """
+        Pick a fixed reply for retrievals the LLM cannot answer from, saving the API call.
+        
+        Args:
+            prepared (Dict): Output of _prepare_context()
+            strict (bool): Also short-circuit low-confidence retrievals
+            
+        Returns:
+            Optional[str]: Canned answer, or None if the LLM should be called
+        """
+        # Hits whose candidate or text is gone leave nothing to answer from
+        if not prepared['context']:
+            return self.NO_CONTEXT_ANSWER
+        if strict and prepared['confidence'] == 'low':
+            return self.LOW_CONFIDENCE_ANSWER
+        return None
+    
+    def _prepare_context(self, question: str, candidate_id: Optional[str], top_k: int,
+                         question_embedding: Optional[np.ndarray]) -> Optional[Dict[str, Any]]:
+        """
+        Run the retrieval steps of the RAG pipeline.
+        
+        Args:
+            question (str): User's question
+            candidate_id (Optional[str]): Scope search to specific candidate
+            top_k (int): Number of context chunks to retrieve
+            question_embedding (Optional[np.ndarray]): Precomputed question embedding
+            
+        Returns:
+            Optional[Dict]: Context text, sources, and confidence, or None if nothing matched
+        """
+        # Step 1: Generate embedding for question
+        logger.info(f"Processing question: {question[:50]}...")
+        if question_embedding is None:
+            question_embedding = self.embedding_service.embed_query(question)
+        
+        # Step 2: Retrieve relevant context from FAISS (fetch more than needed)
+        # Request extra results in case filtering reduces the count
+        search_k = max(top_k, 15)
+        search_results = self.faiss_index.search(
+            question_embedding,
+            k=search_k,
+            candidate_id=candidate_id
+        )
+        
+        # If no results and we have a candidate_id, try again without filtering
+        if not search_results and candidate_id:
+            logger.info(f"No results for candidate {candidate_id}, trying across all candidates")
+            search_results = self.faiss_index.search(
+                question_embedding,
+                k=search_k
+            )
+        
+        if not search_results:
+            logger.warning("No relevant context found in FAISS index")
+            return None
+        
+        # Step 3: Format context for LLM, with all candidate names fetched in one query
+        names = self.db_repo.get_candidate_names(
+            [result.get('metadata', {}).get('candidate_id') for result in search_results[:top_k]]
+        )
+        
+        # Step 5 (confidence) only needs the scores, so it is settled before generation
+        return {
+            'context': self._format_context(search_results[:top_k], names),
+            'sources': self._extract_sources(search_results[:top_k], names),
+            'confidence': self._evaluate_confidence(search_results[:top_k])
+        }
+    
     def extract_filters(self, question: str) -> Dict[str, Any]:
         """
         Extract query filters from natural language question.
@@ -128,134 +252,82 @@ class QueryAgent:
                         "role": "system",
                         "content": """Extract structured filters from user questions about CVs.
                         Return JSON with: candidate_name, required_skills, min_experience_years, company.
-                        Only include fields that are explicitly mentioned. Use null for missing fields."""
+                        Only include fields that are explicitly mentioned. Use null for missing fields.
+                        Respond with a JSON object only."""
                     },
                     {
                         "role": "user",
                         "content": f"Extract filters from this question: {question}"
                     }
                 ],
-                temperature=0.3
+                temperature=0.3,
+                # JSON mode: the reply is always a single parseable JSON object
+                response_format={"type": "json_object"}
             )
             
-            # Parse response
-            response_text = response.choices[0].message.content
-            
-            # Try to extract JSON
-            import json
-            import re
-            json_match = re.search(r'\{.*\}', response_text, re.DOTALL)
-            if json_match:
-                filters = json.loads(json_match.group())
-                # Remove null values
-                return {k: v for k, v in filters.items() if v is not None}
+            filters = json.loads(response.choices[0].message.content)
             
-            return {}
+            # Remove null values
+            return {k: v for k, v in filters.items() if v is not None}
         
         except Exception as e:
             logger.warning(f"Error extracting filters: {str(e)}")
             return {}
     
-    def _format_context(self, search_results: List[Dict]) -> str:
+    def _format_context(self, search_results: List[Dict], names: Dict[str, str]) -> str:
         """
         Format search results into context for LLM.
         
         Args:
             search_results (List[Dict]): Search results from FAISS
+            names (Dict[str, str]): Candidate names keyed by candidate_id
             
         Returns:
             str: Formatted context string
         """
         context_parts = []
         
+        # Chunks indexed without their text are read from the chunks table in one query
+        stored_texts = self.db_repo.get_chunk_texts([
+            (result.get('metadata', {}).get('candidate_id'), result.get('metadata', {}).get('section'))
+            for result in search_results
+            if not result.get('metadata', {}).get('text')
+        ])
+        
         for result in search_results:
             metadata = result.get('metadata', {})
             candidate_id = metadata.get('candidate_id')
             
             # Get candidate info
-            candidate = self.db_repo.get_candidate(candidate_id)
-            if not candidate:
+            name = names.get(candidate_id)
+            if not name:
                 continue
             
             chunk_type = metadata.get('chunk_type', 'unknown')
             section = metadata.get('section', 'unknown')
-            distance = result.get('distance', 0)
+            score = result.get('score', 0)
             
-            # Use stored text from metadata, or reconstruct if not available
-            text = metadata.get('text')
-            if not text:
-                text = self._reconstruct_chunk_text(candidate, chunk_type, section)
+            # Use stored text from metadata, falling back to the chunks table
+            text = metadata.get('text') or stored_texts.get((candidate_id, section))
             
             if text:
-                # Calculate relevance score (inverse of distance)
-                relevance_score = 1 / (1 + distance)
+                # Cosine similarity of the chunk to the question
+                relevance_score = score
                 context_parts.append(
-                    f"[{candidate.get('name')} - {chunk_type.upper()} ({section})]\n{text}\n"
+                    f"[{name} - {chunk_type.upper()} ({section})]\n{text}\n"
                     f"(Relevance Score: {relevance_score:.2f})"
                 )
         
         return "\n\n---\n\n".join(context_parts)
     
-    def _reconstruct_chunk_text(self, candidate: Dict, chunk_type: str, section: str) -> str:
-        """
-        Reconstruct text chunk from candidate data and metadata.
-        
-        Args:
-            candidate (Dict): Candidate data
-            chunk_type (str): Type of chunk (experience, project, skills, etc.)
-            section (str): Section identifier
-            
-        Returns:
-            str: Reconstructed text
-        """
-        if chunk_type == 'summary':
-            return candidate.get('summary', '')
-        
-        elif chunk_type == 'skills':
-            skills = candidate.get('skills', [])
-            return f"Skills: {', '.join(skills)}"
-        
-        elif chunk_type == 'experience':
-            section_num = int(section.split('_')[-1]) if '_' in section else 0
-            experiences = candidate.get('experience', [])
-            if section_num < len(experiences):
-                exp = experiences[section_num]
-                return f"{exp.get('title')} at {exp.get('company')} ({exp.get('duration', '')}). {exp.get('description', '')}"
-        
-        elif chunk_type == 'project':
-            section_num = int(section.split('_')[-1]) if '_' in section else 0
-            projects = candidate.get('projects', [])
-            if section_num < len(projects):
-                proj = projects[section_num]
-                techs = ', '.join(proj.get('technologies', []))
-                return f"{proj.get('name')}. {proj.get('description', '')}. Technologies: {techs}"
-        
-        elif chunk_type == 'education':
-            section_num = int(section.split('_')[-1]) if '_' in section else 0
-            education = candidate.get('education', [])
-            if section_num < len(education):
-                edu = education[section_num]
-                return f"{edu.get('degree', '')} from {edu.get('institution', '')} ({edu.get('year', '')}). {edu.get('details', '')}"
-        
-        elif chunk_type == 'certification':
-            section_num = int(section.split('_')[-1]) if '_' in section else 0
-            certifications = candidate.get('certifications', [])
-            if section_num < len(certifications):
-                cert = certifications[section_num]
-                return f"{cert.get('name', '')} from {cert.get('issuer', '')} ({cert.get('year', '')})"
-        
-        elif chunk_type == 'interests':
-            interests = candidate.get('interests', [])
-            return f"Interests and Hobbies: {', '.join(interests)}"
-        
-        return ""
-    
-    def _extract_sources(self, search_results: List[Dict]) -> List[Dict[str, Any]]:
+    def _extract_sources(self, search_results: List[Dict],
+                         names: Dict[str, str]) -> List[Dict[str, Any]]:
         """
         Extract source information from search results.
         
         Args:
             search_results (List[Dict]): Search results
+            names (Dict[str, str]): Candidate names keyed by candidate_id
             
         Returns:
             List[Dict]: Source information
@@ -266,14 +338,14 @@ class QueryAgent:
             metadata = result.get('metadata', {})
             candidate_id = metadata.get('candidate_id')
             
-            candidate = self.db_repo.get_candidate(candidate_id)
-            if candidate:
+            name = names.get(candidate_id)
+            if name:
                 sources.append({
-                    'candidate_name': candidate.get('name'),
+                    'candidate_name': name,
                     'candidate_id': candidate_id,
                     'section': metadata.get('section'),
                     'chunk_type': metadata.get('chunk_type'),
-                    'relevance': 1 / (1 + result.get('distance', 0))
+                    'relevance': result.get('score', 0)
                 })
         
         return sources
@@ -290,7 +362,24 @@ class QueryAgent:
             str: Generated answer
         """
         try:
-            prompt = f"""Based on the following CV context, answer the user's question comprehensively.
+            return "".join(self._stream_answer(question, context)).strip()
+        
+        except Exception as e:
+            logger.error(f"Error generating answer: {str(e)}")
+            return "Unable to generate answer due to an error."
+    
+    def _stream_answer(self, question: str, context: str) -> Iterator[str]:
+        """
+        Stream the LLM answer for the provided context.
+        
+        Args:
+            question (str): User's question
+            context (str): Retrieved context from FAISS
+            
+        Yields:
+            str: Pieces of the answer text as the model generates them
+        """
+        prompt = f"""Based on the following CV context, answer the user's question comprehensively.
 You have been provided with the most relevant sections from the CV.
 - Answer as completely as possible using all the provided context
 - If the question asks for a list, provide the complete list from the context
@@ -305,36 +394,34 @@ QUESTION:
 {question}
 
 ANSWER:"""
-            
-            response = self.client.chat.completions.create(
-                model=self.model,
-                messages=[
-                    {
-                        "role": "system",
-                        "content": "You are a thorough CV analysis assistant. Answer questions based on the provided CV data. Be comprehensive and include all relevant details from the context provided."
-                    },
-                    {
-                        "role": "user",
-                        "content": prompt
-                    }
-                ],
-                temperature=0.7,
-                max_tokens=1000
-            )
-            
-            answer = response.choices[0].message.content.strip()
-            return answer
         
-        except Exception as e:
-            logger.error(f"Error generating answer: {str(e)}")
-            return "Unable to generate answer due to an error."
+        response = self.client.chat.completions.create(
+            model=self.model,
+            messages=[
+                {
+                    "role": "system",
+                    "content": "You are a thorough CV analysis assistant. Answer questions based on the provided CV data. Be comprehensive and include all relevant details from the context provided."
+                },
+                {
+                    "role": "user",
+                    "content": prompt
+                }
+            ],
+            temperature=0.7,
+            max_tokens=1000,
+            stream=True
+        )
+        
+        for chunk in response:
+            if chunk.choices and chunk.choices[0].delta.content:
+                yield chunk.choices[0].delta.content
     
     def _evaluate_confidence(self, search_results: List[Dict]) -> str:
         """
         Evaluate confidence based on search result relevance.
         
         Args:
-            search_results (List[Dict]): Search results with distances
+            search_results (List[Dict]): Search results with cosine similarity scores
             
         Returns:
             str: Confidence level (high, medium, low)
@@ -342,12 +429,17 @@ ANSWER:"""
         if not search_results:
             return 'low'
         
-        # Calculate average distance (lower is better)
-        avg_distance = np.mean([r.get('distance', float('inf')) for r in search_results])
+        # Calculate average similarity (higher is better). On unit vectors the
+        # squared L2 distance is 2 - 2 * score, so 0.5 / 0.0 match distances 1.0 / 2.0
+        scores = np.fromiter(
+            (r.get('score', -1.0) for r in search_results),
+            dtype=np.float32, count=len(search_results)
+        )
+        avg_score = float(scores.mean())
         
-        if avg_distance < 1.0:
+        if avg_score > 0.5:
             return 'high'
-        elif avg_distance < 2.0:
+        elif avg_score > 0.0:
             return 'medium'
         else:
             return 'low'
@@ -0,0 +1,102 @@
+"""
+Thread-safe LRU cache with per-entry time-to-live.
+Used to memoize repeated lookups such as FAISS searches for the same query vector.
+"""
+
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, Optional, Tuple
+
+
+class QueryCache:
+    """LRU cache whose entries expire ttl_seconds after they were stored."""
+    
+    def __init__(self, max_size: int = 2000, ttl_seconds: float = 300.0):
+        """
+        Initialize the cache.
+        
+        Args:
+            max_size (int): Maximum number of entries (least recently used are evicted)
+            ttl_seconds (float): Seconds an entry stays valid; 0 disables expiry
+        """
+        self.max_size = max_size
+        self.ttl_seconds = ttl_seconds
+        # key -> (expiry time, value), in LRU order
+        self._entries: "OrderedDict[Hashable, Tuple[float, Any]]" = OrderedDict()
+        self._lock = threading.RLock()
+        self.hits = 0
+        self.misses = 0
+    
+    def get(self, key: Hashable) -> Optional[Any]:
+        """
+        Look up a value.
+        
+        Args:
+            key (Hashable): Cache key
+        
+        Returns:
+            Optional[Any]: Cached value, or None if missing or expired
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            
+            expires_at, value = entry
+            if self.ttl_seconds and expires_at < time.monotonic():
+                del self._entries[key]
+                self.misses += 1
+                return None
+            
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+    
+    def put(self, key: Hashable, value: Any):
+        """
+        Store a value.
+        
+        Args:
+            key (Hashable): Cache key
+            value (Any): Value to cache
+        """
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl_seconds, value)
+            self._entries.move_to_end(key)
+            
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+    
+    def invalidate(self, key: Hashable):
+        """
+        Drop one entry if present.
+        
+        Args:
+            key (Hashable): Cache key
+        """
+        with self._lock:
+            self._entries.pop(key, None)
+    
+    def clear(self):
+        """Drop all entries."""
+        with self._lock:
+            self._entries.clear()
+    
+    def get_stats(self) -> Dict[str, Any]:
+        """
+        Get cache statistics.
+        
+        Returns:
+            Dict: Size, capacity, TTL and hit/miss counters
+        """
+        total = self.hits + self.misses
+        return {
+            'size': len(self._entries),
+            'max_size': self.max_size,
+            'ttl_seconds': self.ttl_seconds,
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': self.hits / total if total else 0.0
+        }
@@ -0,0 +1,179 @@
+"""
+Application-scoped service registry.
+Keeps one instance of each service per Flask app so request handlers
+do not rebuild API clients, reload the FAISS index or re-run schema setup.
+"""
+
+import atexit
+import logging
+import threading
+from typing import Any, Callable
+
+from flask import Flask, current_app
+
+from services.sqlite_repo import SQLiteRepository
+from services.faiss_index import FAISSIndex, IndexPersister
+from services.embedding import EmbeddingService
+from services.llm_parser import LLMParser
+from services.query_agent import QueryAgent
+from services.semantic_cache import SemanticCache
+
+logger = logging.getLogger(__name__)
+
+_lock = threading.RLock()
+
+
+def init_app(app: Flask):
+    """
+    Eagerly create the services that do not need an API key.
+    
+    Args:
+        app (Flask): Application to attach the services to
+    """
+    app.extensions['db_repo'] = SQLiteRepository(app.config['DATABASE'])
+    app.extensions['faiss_index'] = _create_faiss_index(app)
+    
+    # Write index changes to disk in the background
+    persister = IndexPersister(
+        app.extensions['faiss_index'],
+        interval=app.config['FAISS_SAVE_INTERVAL'],
+        max_pending=app.config['FAISS_SAVE_EVERY']
+    )
+    persister.start()
+    atexit.register(persister.flush)
+    app.extensions['index_persister'] = persister
+
+
+def _create_faiss_index(app: Flask) -> FAISSIndex:
+    """
+    Build the FAISS index from the application config.
+    
+    Args:
+        app (Flask): Application holding the FAISS settings
+    
+    Returns:
+        FAISSIndex: Loaded or newly created index
+    """
+    return FAISSIndex(
+        app.config['FAISS_INDEX_PATH'],
+        index_factory=app.config['FAISS_INDEX_FACTORY'],
+        train_size=app.config['FAISS_TRAIN_SIZE'],
+        mmap=app.config['FAISS_MMAP'],
+        ef_search=app.config['FAISS_HNSW_EF_SEARCH'],
+        large_index_factory=app.config['FAISS_LARGE_INDEX_FACTORY'],
+        large_index_size=app.config['FAISS_LARGE_INDEX_SIZE'],
+        nprobe=app.config['FAISS_IVF_NPROBE'],
+        search_cache_size=app.config['FAISS_SEARCH_CACHE_SIZE'],
+        search_cache_ttl=app.config['FAISS_SEARCH_CACHE_TTL'],
+        gpu=app.config['FAISS_GPU_BACKEND'] == 'faiss'
+    )
+
+
+def _get_or_create(key: str, factory: Callable[[], Any]) -> Any:
+    """
+    Return the service stored under key, creating it on first use.
+    
+    Args:
+        key (str): Name of the service in app.extensions
+        factory (Callable): Builds the service when it does not exist yet
+    
+    Returns:
+        Any: The shared service instance
+    """
+    extensions = current_app.extensions
+    service = extensions.get(key)
+    if service is None:
+        with _lock:
+            service = extensions.get(key)
+            if service is None:
+                service = factory()
+                extensions[key] = service
+    return service
+
+
+def get_db_repo() -> SQLiteRepository:
+    """Return the shared SQLite repository."""
+    return _get_or_create('db_repo', lambda: SQLiteRepository(current_app.config['DATABASE']))
+
+
+def get_faiss_index() -> FAISSIndex:
+    """Return the shared FAISS index."""
+    return _get_or_create('faiss_index', lambda: _create_faiss_index(current_app))
+
+
+def get_search_index():
+    """
+    Return the index used to answer searches.
+
+    This is the shared FAISS index, wrapped in the cuVS CAGRA backend when
+    FAISS_GPU_BACKEND is "cagra" and a CUDA device is available.
+    """
+    return _get_or_create('search_index', _create_search_index)
+
+
+def _create_search_index():
+    """Build the search backend from the application config."""
+    faiss_index = get_faiss_index()
+    if current_app.config['FAISS_GPU_BACKEND'] != 'cagra':
+        return faiss_index
+    
+    from services.faiss_index_gpu import CagraIndex, gpu_available
+    if not gpu_available():
+        logger.warning("FAISS_GPU_BACKEND=cagra but cuVS/CUDA is unavailable, using CPU index")
+        return faiss_index
+    return CagraIndex(faiss_index, min_vectors=current_app.config['FAISS_GPU_MIN_VECTORS'])
+
+
+def get_index_persister() -> IndexPersister:
+    """Return the background writer for the shared FAISS index."""
+    return current_app.extensions['index_persister']
+
+
+def get_embedding_service() -> EmbeddingService:
+    """Return the shared embedding service."""
+    return _get_or_create(
+        'embedding_service', lambda: EmbeddingService(cache_repo=get_db_repo())
+    )
+
+
+def get_llm_parser() -> LLMParser:
+    """Return the shared LLM parser."""
+    return _get_or_create('llm_parser', LLMParser)
+
+
+def get_query_agent() -> QueryAgent:
+    """Return the shared query agent wired to the other shared services."""
+    return _get_or_create(
+        'query_agent',
+        lambda: QueryAgent(get_db_repo(), get_search_index(), get_embedding_service())
+    )
+
+
+def get_query_cache() -> SemanticCache:
+    """Return the shared semantic cache for /query answers."""
+    return _get_or_create('query_cache', _create_semantic_cache)
+
+
+def get_search_cache() -> SemanticCache:
+    """Return the shared semantic cache for /search results."""
+    return _get_or_create(
+        'search_cache',
+        lambda: _create_semantic_cache(lsh_bits=current_app.config['SEARCH_CACHE_LSH_BITS'])
+    )
+
+
+def invalidate_response_caches():
+    """Clear cached answers and search results after the CV corpus changed."""
+    for key in ('query_cache', 'search_cache'):
+        cache = current_app.extensions.get(key)
+        if cache is not None:
+            cache.clear()
+
+
+def _create_semantic_cache(lsh_bits: int = 0) -> SemanticCache:
+    """Build a semantic cache from the application config."""
+    return SemanticCache(
+        max_size=current_app.config['SEMANTIC_CACHE_SIZE'],
+        threshold=current_app.config['SEMANTIC_CACHE_THRESHOLD'],
+        lsh_bits=lsh_bits
+    )
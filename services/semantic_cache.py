@@ -0,0 +1,198 @@
+"""
+Semantic cache for question/search responses.
+Returns a stored response when a new query is textually identical to, or
+semantically very close to, a query that was already answered.
+"""
+
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, Optional, Set, Tuple
+import numpy as np
+import faiss
+import logging
+
+from services.embedding import LSH_MAX_BITS, signature
+
+logger = logging.getLogger(__name__)
+
+
+class SemanticCache:
+    """LRU response cache with exact-text and embedding-similarity lookup."""
+    
+    def __init__(self, max_size: int = 10000, threshold: float = 0.97,
+                 dimension: int = 1536, probe_size: int = 8, lsh_bits: int = 0):
+        """
+        Initialize the semantic cache.
+        
+        Args:
+            max_size (int): Maximum number of cached responses (LRU eviction)
+            threshold (float): Minimum cosine similarity for a semantic hit
+            dimension (int): Embedding dimension
+            probe_size (int): Number of nearest cached queries checked per lookup
+            lsh_bits (int): Random-projection LSH signature length. When set,
+                            queries sharing the signature are checked before the
+                            similarity index is searched. 0 disables LSH.
+        """
+        self.max_size = max_size
+        self.threshold = threshold
+        self.dimension = dimension
+        self.probe_size = probe_size
+        self.lsh_bits = lsh_bits
+        
+        # (scope, text) -> entry id, in LRU order
+        self._keys: "OrderedDict[Tuple[Hashable, str], int]" = OrderedDict()
+        # entry id -> (key, value, embedding, LSH signature)
+        self._entries: Dict[int, Tuple[Tuple[Hashable, str], Any, np.ndarray, int]] = {}
+        self._index = faiss.IndexIDMap2(faiss.IndexFlatIP(dimension))
+        
+        # LSH signature -> entry ids
+        self._buckets: Dict[int, Set[int]] = {}
+        if not 0 <= lsh_bits <= LSH_MAX_BITS:
+            raise ValueError(f"lsh_bits must be between 0 and {LSH_MAX_BITS}")
+        
+        self._next_id = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+    
+    def get(self, text: str, scope: Hashable = None) -> Optional[Any]:
+        """
+        Look up a response by query text.
+        
+        Texts are compared case- and whitespace-insensitively, so trivially
+        different phrasings are answered without computing an embedding.
+        
+        Args:
+            text (str): Query text
+            scope (Hashable): Extra key parts the response depends on (e.g. candidate_id, top_k)
+        
+        Returns:
+            Optional[Any]: Cached response or None
+        """
+        key = (scope, self._normalize_text(text))
+        
+        with self._lock:
+            entry_id = self._keys.get(key)
+            if entry_id is None:
+                return None
+            
+            self._keys.move_to_end(key)
+            self.hits += 1
+            return self._entries[entry_id][1]
+    
+    def get_similar(self, embedding: np.ndarray, scope: Hashable = None) -> Optional[Any]:
+        """
+        Look up a response by query embedding similarity.
+        
+        Args:
+            embedding (np.ndarray): Unit-length query embedding
+            scope (Hashable): Extra key parts the response depends on
+        
+        Returns:
+            Optional[Any]: Response of the closest cached query above the threshold, or None
+        """
+        query = np.ascontiguousarray(embedding.reshape(-1), dtype=np.float32)
+        
+        with self._lock:
+            if self._index.ntotal == 0:
+                self.misses += 1
+                return None
+            
+            # Fast path: compare only against queries in the same LSH bucket
+            if self.lsh_bits:
+                for entry_id in self._buckets.get(signature(query, self.lsh_bits), ()):
+                    key, value, cached, _ = self._entries[entry_id]
+                    if key[0] == scope and float(cached @ query) >= self.threshold:
+                        self._keys.move_to_end(key)
+                        self.hits += 1
+                        return value
+            
+            similarities, ids = self._index.search(
+                query.reshape(1, -1), min(self.probe_size, self._index.ntotal)
+            )
+            
+            for similarity, entry_id in zip(similarities[0], ids[0]):
+                if entry_id == -1 or similarity < self.threshold:
+                    break
+                
+                key, value, _, _ = self._entries[int(entry_id)]
+                if key[0] == scope:
+                    self._keys.move_to_end(key)
+                    self.hits += 1
+                    return value
+            
+            self.misses += 1
+            return None
+    
+    def put(self, text: str, embedding: np.ndarray, value: Any, scope: Hashable = None):
+        """
+        Store a response for a query.
+        
+        Args:
+            text (str): Query text
+            embedding (np.ndarray): Unit-length query embedding
+            value (Any): Response to cache
+            scope (Hashable): Extra key parts the response depends on
+        """
+        key = (scope, self._normalize_text(text))
+        embedding = np.ascontiguousarray(embedding.reshape(-1), dtype=np.float32)
+        
+        with self._lock:
+            if key in self._keys:
+                self._remove(self._keys.pop(key))
+            
+            entry_id = self._next_id
+            self._next_id += 1
+            
+            self._index.add_with_ids(embedding.reshape(1, -1), np.array([entry_id], dtype=np.int64))
+            self._keys[key] = entry_id
+            
+            lsh_signature = signature(embedding, self.lsh_bits) if self.lsh_bits else 0
+            if self.lsh_bits:
+                self._buckets.setdefault(lsh_signature, set()).add(entry_id)
+            self._entries[entry_id] = (key, value, embedding, lsh_signature)
+            
+            # Evict least recently used entries
+            while len(self._keys) > self.max_size:
+                _, evicted_id = self._keys.popitem(last=False)
+                self._remove(evicted_id)
+    
+    def clear(self):
+        """Drop all cached responses, e.g. after the CV corpus changed."""
+        with self._lock:
+            self._keys.clear()
+            self._entries.clear()
+            self._buckets.clear()
+            self._index.reset()
+            logger.debug("Semantic cache cleared")
+    
+    def get_stats(self) -> Dict[str, Any]:
+        """
+        Get cache statistics.
+        
+        Returns:
+            Dict: Size, capacity, threshold and hit/miss counters
+        """
+        return {
+            'size': len(self._keys),
+            'max_size': self.max_size,
+            'threshold': self.threshold,
+            'hits': self.hits,
+            'misses': self.misses
+        }
+    
+    @staticmethod
+    def _normalize_text(text: str) -> str:
+        """Lowercase and collapse whitespace for exact-text lookups."""
+        return ' '.join(text.lower().split())
+    
+    def _remove(self, entry_id: int):
+        """Remove an entry's embedding and value (lock must be held)."""
+        entry = self._entries.pop(entry_id, None)
+        if entry is not None and self.lsh_bits:
+            bucket = self._buckets.get(entry[3])
+            if bucket is not None:
+                bucket.discard(entry_id)
+                if not bucket:
+                    del self._buckets[entry[3]]
+        self._index.remove_ids(np.array([entry_id], dtype=np.int64))
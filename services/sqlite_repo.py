@@ -5,29 +5,69 @@ Serves as the single source of truth for all candidate information.
 
 import sqlite3
 import json
-from typing import Optional, List, Dict, Any
+import threading
+from typing import Optional, List, Dict, Any, Tuple
+import numpy as np
 import logging
 
+from services.query_cache import QueryCache
+
 logger = logging.getLogger(__name__)
 
 
 class SQLiteRepository:
     """Repository for managing CV data in SQLite database."""
     
-    def __init__(self, db_path: str = 'data/cv.db'):
+    # Insert statements as constants: identical SQL text lets each connection's
+    # statement cache reuse the prepared statement instead of parsing it again
+    _INSERT_CANDIDATE_SQL = """
+        INSERT OR REPLACE INTO candidates
+        (id, name, email, phone, summary, skills, experience, education, projects, certifications, interests, file_path, file_name)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+    """
+    _INSERT_CHUNK_SQL = "INSERT INTO chunks (candidate_id, chunk_type, section, text) VALUES (?, ?, ?, ?)"
+    
+    def __init__(self, db_path: str = 'data/cv.db', candidate_cache_size: int = 512):
         """
         Initialize the SQLite repository.
         
         Args:
             db_path (str): Path to the SQLite database file
+            candidate_cache_size (int): Decoded candidate records kept in memory
         """
         self.db_path = db_path
+        # One long-lived connection per thread, opened on first use
+        self._local = threading.local()
+        # candidate_id -> decoded candidate dict, dropped on insert/delete
+        self._candidate_cache = QueryCache(max_size=candidate_cache_size, ttl_seconds=0)
         self._init_database()
     
+    def _conn(self) -> sqlite3.Connection:
+        """
+        Return this thread's connection, opening it on first use.
+        
+        The connection is reused across calls instead of reopening the database
+        for every query. Use it as a context manager: the block commits on
+        success and rolls back on error, but the connection stays open.
+        
+        Returns:
+            sqlite3.Connection: Connection owned by the calling thread
+        """
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, check_same_thread=False)
+            conn.row_factory = sqlite3.Row
+            # WAL lets readers run alongside a writer; NORMAL sync is safe under WAL
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute("PRAGMA cache_size=-20000")
+            self._local.conn = conn
+        return conn
+    
     def _init_database(self):
         """Initialize database schema if not already present."""
         try:
-            with sqlite3.connect(self.db_path) as conn:
+            with self._conn() as conn:
                 cursor = conn.cursor()
                 
                 # Create candidates table
@@ -75,6 +115,43 @@ class SQLiteRepository:
                     )
                 """)
                 
+                # Create embedding cache table (text hash -> float16 vector bytes)
+                cursor.execute("""
+                    CREATE TABLE IF NOT EXISTS embeddings (
+                        text_hash TEXT PRIMARY KEY,
+                        embedding BLOB NOT NULL,
+                        dtype TEXT NOT NULL DEFAULT 'float32',
+                        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                    )
+                """)
+                
+                # Caches written before float16 storage hold float32 vectors
+                cursor.execute("PRAGMA table_info(embeddings)")
+                if 'dtype' not in [col[1] for col in cursor.fetchall()]:
+                    cursor.execute(
+                        "ALTER TABLE embeddings ADD COLUMN dtype TEXT NOT NULL DEFAULT 'float32'"
+                    )
+                    logger.info("Added dtype column to embeddings table")
+                
+                # Create parse cache table (CV text hash -> parsed JSON)
+                cursor.execute("""
+                    CREATE TABLE IF NOT EXISTS parsed_cvs (
+                        text_hash TEXT PRIMARY KEY,
+                        parsed_data TEXT NOT NULL,
+                        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                    )
+                """)
+                
+                # Chunk texts are looked up by candidate and section
+                cursor.execute(
+                    "CREATE INDEX IF NOT EXISTS idx_chunks_candidate ON chunks(candidate_id, section)"
+                )
+                
+                # Listing and filtering order candidates by upload time
+                cursor.execute(
+                    "CREATE INDEX IF NOT EXISTS idx_candidates_created ON candidates(created_at)"
+                )
+                
                 conn.commit()
                 logger.info(f"Database initialized at {self.db_path}")
         
@@ -93,40 +170,14 @@ class SQLiteRepository:
             Dict: The inserted/updated candidate data
         """
         try:
-            with sqlite3.connect(self.db_path) as conn:
+            with self._conn() as conn:
                 cursor = conn.cursor()
                 
                 candidate_id = data.get('candidate_id')
-                
-                # Convert lists/dicts to JSON for storage
-                skills_json = json.dumps(data.get('skills', []))
-                experience_json = json.dumps(data.get('experience', []))
-                education_json = json.dumps(data.get('education', []))
-                projects_json = json.dumps(data.get('projects', []))
-                certifications_json = json.dumps(data.get('certifications', []))
-                interests_json = json.dumps(data.get('interests', []))
-                
-                cursor.execute("""
-                    INSERT OR REPLACE INTO candidates
-                    (id, name, email, phone, summary, skills, experience, education, projects, certifications, interests, file_path, file_name)
-                    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-                """, (
-                    candidate_id,
-                    data.get('name'),
-                    data.get('email'),
-                    data.get('phone'),
-                    data.get('summary'),
-                    skills_json,
-                    experience_json,
-                    education_json,
-                    projects_json,
-                    certifications_json,
-                    interests_json,
-                    data.get('file_path'),
-                    data.get('file_name')
-                ))
+                cursor.execute(self._INSERT_CANDIDATE_SQL, self._candidate_row(data))
                 
                 conn.commit()
+                self._candidate_cache.invalidate(candidate_id)
                 logger.info(f"Candidate {candidate_id} inserted/updated successfully")
                 
                 return data
@@ -135,30 +186,103 @@ class SQLiteRepository:
             logger.error(f"Error inserting candidate: {str(e)}")
             raise
     
+    @staticmethod
+    def _candidate_row(data: Dict[str, Any]) -> tuple:
+        """
+        Build the parameters of _INSERT_CANDIDATE_SQL for one candidate.
+        
+        Args:
+            data (Dict): Candidate data including name, email, skills, experience, etc.
+            
+        Returns:
+            tuple: Column values, with lists/dicts converted to JSON for storage
+        """
+        return (
+            data.get('candidate_id'),
+            data.get('name'),
+            data.get('email'),
+            data.get('phone'),
+            data.get('summary'),
+            json.dumps(data.get('skills', [])),
+            json.dumps(data.get('experience', [])),
+            json.dumps(data.get('education', [])),
+            json.dumps(data.get('projects', [])),
+            json.dumps(data.get('certifications', [])),
+            json.dumps(data.get('interests', [])),
+            data.get('file_path'),
+            data.get('file_name')
+        )
+    
     def get_candidate(self, candidate_id: str) -> Optional[Dict[str, Any]]:
         """
         Retrieve a candidate by ID.
         
+        Decoded records are cached, so callers must treat the returned dict
+        as read-only.
+        
         Args:
             candidate_id (str): The candidate's unique identifier
             
         Returns:
             Optional[Dict]: Candidate data or None if not found
         """
+        candidate = self._candidate_cache.get(candidate_id)
+        if candidate is not None:
+            return candidate
+        
         try:
-            with sqlite3.connect(self.db_path) as conn:
+            with self._conn() as conn:
                 cursor = conn.cursor()
                 cursor.execute("SELECT * FROM candidates WHERE id = ?", (candidate_id,))
                 row = cursor.fetchone()
                 
                 if row:
-                    return self._row_to_dict(row)
+                    candidate = self._row_to_dict(row)
+                    self._candidate_cache.put(candidate_id, candidate)
+                    return candidate
                 return None
         
         except Exception as e:
             logger.error(f"Error retrieving candidate: {str(e)}")
             return None
     
+    def get_candidate_names(self, candidate_ids: List[str]) -> Dict[str, str]:
+        """
+        Retrieve only the names of several candidates with a single query.
+        
+        Unlike get_candidate this decodes none of the JSON columns.
+        
+        Args:
+            candidate_ids (List[str]): Candidate identifiers (duplicates are ignored)
+            
+        Returns:
+            Dict[str, str]: Candidate names keyed by candidate_id; unknown IDs are omitted
+        """
+        unique_ids = list(dict.fromkeys(candidate_ids))
+        if not unique_ids:
+            return {}
+        
+        try:
+            with self._conn() as conn:
+                cursor = conn.cursor()
+                names = {}
+                
+                # Stay below SQLite's bound-parameter limit
+                for start in range(0, len(unique_ids), 500):
+                    batch = unique_ids[start:start + 500]
+                    placeholders = ','.join('?' * len(batch))
+                    cursor.execute(
+                        f"SELECT id, name FROM candidates WHERE id IN ({placeholders})", batch
+                    )
+                    for row in cursor.fetchall():
+                        names[row['id']] = row['name']
+                
+                return names
+        
+        except Exception as e:
+            logger.error(f"Error retrieving candidate names: {str(e)}")
+            return {}
+    
     def get_all_candidates(self) -> List[Dict[str, Any]]:
         """
         Retrieve all candidates with basic info.
@@ -167,7 +291,7 @@ class SQLiteRepository:
             List[Dict]: List of all candidates (basic fields only)
         """
         try:
-            with sqlite3.connect(self.db_path) as conn:
+            with self._conn() as conn:
                 cursor = conn.cursor()
                 cursor.execute("""
                     SELECT id, name, email, phone, created_at FROM candidates
@@ -178,11 +302,11 @@ class SQLiteRepository:
                 candidates = []
                 for row in rows:
                     candidates.append({
-                        'candidate_id': row[0],
-                        'name': row[1],
-                        'email': row[2],
-                        'phone': row[3],
-                        'created_at': row[4]
+                        'candidate_id': row['id'],
+                        'name': row['name'],
+                        'email': row['email'],
+                        'phone': row['phone'],
+                        'created_at': row['created_at']
                     })
                 
                 return candidates
@@ -208,43 +332,50 @@ class SQLiteRepository:
             List[Dict]: Filtered list of candidates
         """
         try:
-            candidates = self.get_all_candidates()
-            
-            # Filter by skills
-            if skills:
-                skills_lower = [s.lower() for s in skills]
-                filtered = []
-                for cand_id in [c['candidate_id'] for c in candidates]:
-                    cand_data = self.get_candidate(cand_id)
-                    if cand_data:
-                        cand_skills = [s.lower() for s in cand_data.get('skills', [])]
-                        if all(skill in cand_skills for skill in skills_lower):
-                            filtered.append(cand_id)
-                candidates = [c for c in candidates if c['candidate_id'] in filtered]
+            with self._conn() as conn:
+                cursor = conn.cursor()
+                cursor.execute("""
+                    SELECT id, name, email, phone, created_at, skills, experience FROM candidates
+                    ORDER BY created_at DESC
+                """)
+                rows = cursor.fetchall()
             
-            # Filter by experience
-            if min_experience_years:
-                filtered = []
-                for cand_id in [c['candidate_id'] for c in candidates]:
-                    cand_data = self.get_candidate(cand_id)
-                    if cand_data and len(cand_data.get('experience', [])) >= min_experience_years:
-                        filtered.append(cand_id)
-                candidates = [c for c in candidates if c['candidate_id'] in filtered]
+            required_skills = {s.lower() for s in skills} if skills else set()
+            company_lower = company.lower() if company else None
             
-            # Filter by company
-            if company:
-                filtered = []
-                company_lower = company.lower()
-                for cand_id in [c['candidate_id'] for c in candidates]:
-                    cand_data = self.get_candidate(cand_id)
-                    if cand_data:
-                        for exp in cand_data.get('experience', []):
-                            if company_lower in exp.get('company', '').lower():
-                                filtered.append(cand_id)
-                                break
-                candidates = [c for c in candidates if c['candidate_id'] in filtered]
+            # Decode each row's JSON once and apply every filter in memory
+            candidates = []
+            for row in rows:
+                if len(candidates) >= limit:
+                    break
+                
+                # Filter by skills
+                if required_skills:
+                    cand_skills = {s.lower() for s in (json.loads(row['skills']) if row['skills'] else [])}
+                    if not required_skills.issubset(cand_skills):
+                        continue
+                
+                experience = json.loads(row['experience']) if row['experience'] else []
+                
+                # Filter by experience
+                if min_experience_years and len(experience) < min_experience_years:
+                    continue
+                
+                # Filter by company
+                if company_lower and not any(
+                    company_lower in exp.get('company', '').lower() for exp in experience
+                ):
+                    continue
+                
+                candidates.append({
+                    'candidate_id': row['id'],
+                    'name': row['name'],
+                    'email': row['email'],
+                    'phone': row['phone'],
+                    'created_at': row['created_at']
+                })
             
-            return candidates[:limit]
+            return candidates
         
         except Exception as e:
             logger.error(f"Error filtering candidates: {str(e)}")
@@ -261,7 +392,7 @@ class SQLiteRepository:
             bool: True if deleted, False otherwise
         """
         try:
-            with sqlite3.connect(self.db_path) as conn:
+            with self._conn() as conn:
                 cursor = conn.cursor()
                 
                 # Delete candidate
@@ -271,6 +402,7 @@ class SQLiteRepository:
                 cursor.execute("DELETE FROM chunks WHERE candidate_id = ?", (candidate_id,))
                 
                 conn.commit()
+                self._candidate_cache.invalidate(candidate_id)
                 logger.info(f"Candidate {candidate_id} deleted successfully")
                 return True
         
@@ -278,29 +410,217 @@ class SQLiteRepository:
             logger.error(f"Error deleting candidate: {str(e)}")
             return False
     
-    def _row_to_dict(self, row: tuple) -> Dict[str, Any]:
+    def insert_chunks(self, candidate_id: str, chunks: List[Dict[str, Any]]):
+        """
+        Store the searchable chunks of a candidate, replacing any stored before.
+        
+        Args:
+            candidate_id (str): The candidate's unique identifier
+            chunks (List[Dict]): Chunks with type, section and text
+        """
+        try:
+            with self._conn() as conn:
+                cursor = conn.cursor()
+                cursor.execute("DELETE FROM chunks WHERE candidate_id = ?", (candidate_id,))
+                cursor.executemany(
+                    self._INSERT_CHUNK_SQL,
+                    [
+                        (candidate_id, chunk['type'], chunk.get('section', 'unknown'), chunk['text'])
+                        for chunk in chunks
+                    ]
+                )
+                conn.commit()
+        
+        except Exception as e:
+            logger.error(f"Error inserting chunks: {str(e)}")
+            raise
+    
+    def get_chunk_texts(self, keys: List[Tuple[str, str]]) -> Dict[Tuple[str, str], str]:
+        """
+        Look up stored chunk texts with a single query.
+        
+        Chunks are addressed by (candidate_id, section) rather than by FAISS
+        vector ID, because vector IDs are renumbered when candidates are deleted.
+        
+        Args:
+            keys (List[Tuple[str, str]]): (candidate_id, section) pairs (duplicates are ignored)
+            
+        Returns:
+            Dict[Tuple[str, str], str]: Chunk texts keyed by (candidate_id, section);
+                                        unknown chunks are omitted
+        """
+        unique_keys = list(dict.fromkeys(keys))
+        if not unique_keys:
+            return {}
+        
+        try:
+            with self._conn() as conn:
+                cursor = conn.cursor()
+                texts = {}
+                
+                # Stay below SQLite's bound-parameter limit (two per key)
+                for start in range(0, len(unique_keys), 250):
+                    batch = unique_keys[start:start + 250]
+                    placeholders = ','.join(['(?, ?)'] * len(batch))
+                    cursor.execute(
+                        f"SELECT candidate_id, section, text FROM chunks "
+                        f"WHERE (candidate_id, section) IN (VALUES {placeholders})",
+                        [value for key in batch for value in key]
+                    )
+                    for row in cursor.fetchall():
+                        texts[(row['candidate_id'], row['section'])] = row['text']
+                
+                return texts
+        
+        except Exception as e:
+            logger.error(f"Error retrieving chunk texts: {str(e)}")
+            return {}
+    
+    def get_embeddings(self, text_hashes: List[str]) -> Dict[str, np.ndarray]:
+        """
+        Look up cached embeddings by text hash.
+        
+        Args:
+            text_hashes (List[str]): Hashes produced by EmbeddingService.text_hash()
+            
+        Returns:
+            Dict[str, np.ndarray]: float32 embeddings keyed by hash; unknown hashes are omitted
+        """
+        unique_hashes = list(dict.fromkeys(text_hashes))
+        if not unique_hashes:
+            return {}
+        
+        try:
+            with self._conn() as conn:
+                cursor = conn.cursor()
+                embeddings = {}
+                
+                # Stay below SQLite's bound-parameter limit
+                for start in range(0, len(unique_hashes), 500):
+                    batch = unique_hashes[start:start + 500]
+                    placeholders = ','.join('?' * len(batch))
+                    cursor.execute(
+                        f"SELECT text_hash, embedding, dtype FROM embeddings "
+                        f"WHERE text_hash IN ({placeholders})",
+                        batch
+                    )
+                    for text_hash, blob, dtype in cursor.fetchall():
+                        embeddings[text_hash] = np.frombuffer(blob, dtype=dtype).astype(np.float32)
+                
+                return embeddings
+        
+        except Exception as e:
+            logger.error(f"Error retrieving cached embeddings: {str(e)}")
+            return {}
+    
+    def insert_embeddings(self, embeddings: Dict[str, np.ndarray]):
+        """
+        Store embeddings in the cache table.
+        
+        Vectors are stored as float16, half the size of float32. The FAISS
+        index keeps them at float16 precision by default anyway (SQfp16).
+        
+        Args:
+            embeddings (Dict[str, np.ndarray]): Embeddings keyed by text hash
+        """
+        if not embeddings:
+            return
+        
+        try:
+            with self._conn() as conn:
+                cursor = conn.cursor()
+                cursor.executemany(
+                    "INSERT OR REPLACE INTO embeddings (text_hash, embedding, dtype) "
+                    "VALUES (?, ?, 'float16')",
+                    [
+                        (text_hash, np.asarray(embedding, dtype=np.float16).tobytes())
+                        for text_hash, embedding in embeddings.items()
+                    ]
+                )
+                conn.commit()
+        
+        except Exception as e:
+            # The cache is an optimization; a failed write must not fail the upload
+            logger.error(f"Error caching embeddings: {str(e)}")
+    
+    def get_parsed_cv(self, text_hash: str, max_age_seconds: int = 0) -> Optional[Dict[str, Any]]:
+        """
+        Look up a cached LLM parse result.
+        
+        Args:
+            text_hash (str): Hash produced by LLMParser.text_hash()
+            max_age_seconds (int): Ignore entries older than this; 0 means no limit
+            
+        Returns:
+            Optional[Dict]: Parsed CV data, or None if not cached
+        """
+        try:
+            with self._conn() as conn:
+                cursor = conn.cursor()
+                if max_age_seconds:
+                    cursor.execute(
+                        "SELECT parsed_data FROM parsed_cvs "
+                        "WHERE text_hash = ? AND created_at >= datetime('now', ?)",
+                        (text_hash, f"-{int(max_age_seconds)} seconds")
+                    )
+                else:
+                    cursor.execute(
+                        "SELECT parsed_data FROM parsed_cvs WHERE text_hash = ?", (text_hash,)
+                    )
+                row = cursor.fetchone()
+                return json.loads(row['parsed_data']) if row else None
+        
+        except Exception as e:
+            logger.error(f"Error retrieving cached parse: {str(e)}")
+            return None
+    
+    def insert_parsed_cv(self, text_hash: str, parsed_data: Dict[str, Any]):
+        """
+        Store an LLM parse result in the cache table.
+        
+        Args:
+            text_hash (str): Hash produced by LLMParser.text_hash()
+            parsed_data (Dict): Parsed CV data
+        """
+        try:
+            with self._conn() as conn:
+                cursor = conn.cursor()
+                cursor.execute(
+                    "INSERT OR REPLACE INTO parsed_cvs (text_hash, parsed_data) VALUES (?, ?)",
+                    (text_hash, json.dumps(parsed_data))
+                )
+                conn.commit()
+        
+        except Exception as e:
+            # The cache is an optimization; a failed write must not fail the upload
+            logger.error(f"Error caching parse result: {str(e)}")
+    
+    def _row_to_dict(self, row: sqlite3.Row) -> Dict[str, Any]:
         """
         Convert database row to dictionary with parsed JSON fields.
         
+        Columns are read by name, so the result does not depend on the column
+        order (interests comes last in databases migrated with ALTER TABLE).
+        
         Args:
-            row (tuple): Database row tuple
+            row (sqlite3.Row): Row from a SELECT * on candidates
             
         Returns:
             Dict: Candidate data dictionary
         """
         return {
-            'candidate_id': row[0],
-            'name': row[1],
-            'email': row[2],
-            'phone': row[3],
-            'summary': row[4],
-            'skills': json.loads(row[5]) if row[5] else [],
-            'experience': json.loads(row[6]) if row[6] else [],
-            'education': json.loads(row[7]) if row[7] else [],
-            'projects': json.loads(row[8]) if row[8] else [],
-            'certifications': json.loads(row[9]) if row[9] else [],
-            'interests': json.loads(row[10]) if row[10] else [],
-            'file_path': row[11],
-            'file_name': row[12],
-            'created_at': row[13]
+            'candidate_id': row['id'],
+            'name': row['name'],
+            'email': row['email'],
+            'phone': row['phone'],
+            'summary': row['summary'],
+            'skills': json.loads(row['skills']) if row['skills'] else [],
+            'experience': json.loads(row['experience']) if row['experience'] else [],
+            'education': json.loads(row['education']) if row['education'] else [],
+            'projects': json.loads(row['projects']) if row['projects'] else [],
+            'certifications': json.loads(row['certifications']) if row['certifications'] else [],
+            'interests': json.loads(row['interests']) if row['interests'] else [],
+            'file_path': row['file_path'],
+            'file_name': row['file_name'],
+            'created_at': row['created_at']
         }
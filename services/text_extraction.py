@@ -3,10 +3,106 @@ Text extraction service for PDF and DOCX files.
 Handles conversion of CV documents to plain text.
 """
 
+import io
+import multiprocessing
 import os
-from typing import Optional
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from typing import Optional, Union, BinaryIO, List
 import PyPDF2
 from docx import Document
+from docx.oxml.ns import qn
+from docx.table import Table, _Cell
+from docx.text.paragraph import Paragraph
+import logging
+
+logger = logging.getLogger(__name__)
+
+try:
+    import pypdfium2 as pdfium
+except ImportError:  # pypdfium2 is optional; PyPDF2 is used without it
+    pdfium = None
+
+# PDFs with at least this many pages are split into page ranges and extracted
+# in worker processes. pdfium is not thread-safe and PyPDF2 holds the GIL, so
+# threads would not run pages in parallel.
+PDF_PARALLEL_MIN_PAGES = 8
+PDF_MAX_WORKERS = min(4, os.cpu_count() or 1)
+
+_W_P = qn('w:p')
+_W_TBL = qn('w:tbl')
+_W_TR = qn('w:tr')
+_W_TC = qn('w:tc')
+
+_pdf_pool: Optional[ProcessPoolExecutor] = None
+_pdf_pool_lock = threading.Lock()
+
+# Serializes pdfium calls made in this process; request threads would
+# otherwise use the library concurrently
+_pdfium_lock = threading.Lock()
+
+
+def _get_pdf_pool() -> ProcessPoolExecutor:
+    """
+    Return the shared PDF worker pool, starting it on first use.
+    
+    Workers are spawned rather than forked, since forking a multithreaded
+    server process can deadlock the child.
+    
+    Returns:
+        ProcessPoolExecutor: Pool of PDF_MAX_WORKERS processes
+    """
+    global _pdf_pool
+    if _pdf_pool is None:
+        with _pdf_pool_lock:
+            if _pdf_pool is None:
+                _pdf_pool = ProcessPoolExecutor(
+                    max_workers=PDF_MAX_WORKERS,
+                    mp_context=multiprocessing.get_context('spawn')
+                )
+    return _pdf_pool
+
+
+def _extract_page_range(data: bytes, backend: str, start: int, stop: int) -> List[str]:
+    """
+    Extract the text of pages [start, stop) of a PDF; runs in a worker process.
+    
+    Args:
+        data (bytes): Complete PDF file contents
+        backend (str): 'pdfium' or 'pypdf2'
+        start (int): First page index
+        stop (int): Page index after the last page
+        
+    Returns:
+        List[str]: Text of each page in the range
+    """
+    if backend == 'pdfium':
+        pdf = pdfium.PdfDocument(data)
+        try:
+            return [_pdfium_page_text(pdf[page_num]) for page_num in range(start, stop)]
+        finally:
+            pdf.close()
+    
+    pdf_reader = PyPDF2.PdfReader(io.BytesIO(data))
+    return [pdf_reader.pages[page_num].extract_text() for page_num in range(start, stop)]
+
+
+def _pdfium_page_text(page) -> str:
+    """
+    Read the text of a pypdfium2 page and release its native resources.
+    
+    Args:
+        page (pdfium.PdfPage): Page to read
+        
+    Returns:
+        str: Page text
+    """
+    textpage = page.get_textpage()
+    try:
+        return textpage.get_text_range()
+    finally:
+        textpage.close()
+        page.close()
 
 
 class TextExtractor:
@@ -25,71 +121,163 @@ class TextExtractor:
         if not os.path.exists(file_path):
             raise FileNotFoundError(f"File not found: {file_path}")
         
-        file_ext = os.path.splitext(file_path)[1].lower()
+        file_ext = os.path.splitext(file_path)[1]
+        return self.extract_stream(file_path, file_ext)
+    
+    def extract_stream(self, source: Union[str, BinaryIO], file_ext: str) -> Optional[str]:
+        """
+        Extract text from a PDF or DOCX file path or binary stream.
+        
+        Lets uploads be parsed straight from the request stream, without
+        writing them to disk first.
+        
+        Args:
+            source (Union[str, BinaryIO]): File path or seekable binary stream
+            file_ext (str): File extension, with or without the leading dot (e.g. ".pdf")
+            
+        Returns:
+            Optional[str]: Extracted text, None if extraction fails
+        """
+        file_ext = file_ext.lower()
+        if not file_ext.startswith('.'):
+            file_ext = f".{file_ext}"
         
         if file_ext == '.pdf':
-            return self._extract_from_pdf(file_path)
+            return self._extract_from_pdf(source)
         elif file_ext == '.docx':
-            return self._extract_from_docx(file_path)
+            return self._extract_from_docx(source)
         else:
             raise ValueError(f"Unsupported file format: {file_ext}")
     
-    def _extract_from_pdf(self, file_path: str) -> str:
+    def _extract_from_pdf(self, source: Union[str, BinaryIO]) -> str:
         """
         Extract text from PDF file.
         
+        Uses pdfium (C++) through pypdfium2 when it is installed, falling back
+        to the pure-Python PyPDF2 reader if it is missing or fails.
+        
         Args:
-            file_path (str): Path to PDF file
+            source (Union[str, BinaryIO]): Path to PDF file or binary stream
             
         Returns:
             str: Extracted text from all pages
         """
-        text = ""
+        if pdfium is not None:
+            try:
+                return self._extract_from_pdf_pdfium(source)
+            except Exception as e:
+                logger.warning(f"pdfium extraction failed, using PyPDF2: {str(e)}")
+                if hasattr(source, 'seek'):
+                    source.seek(0)
         
         try:
-            with open(file_path, 'rb') as pdf_file:
-                pdf_reader = PyPDF2.PdfReader(pdf_file)
-                
-                for page_num in range(len(pdf_reader.pages)):
-                    page = pdf_reader.pages[page_num]
-                    text += page.extract_text() + "\n"
+            pdf_reader = PyPDF2.PdfReader(source)
+            num_pages = len(pdf_reader.pages)
+            if num_pages >= PDF_PARALLEL_MIN_PAGES and PDF_MAX_WORKERS > 1:
+                parts = self._extract_pages_parallel(source, 'pypdf2', num_pages)
+            else:
+                parts = [page.extract_text() for page in pdf_reader.pages]
         
         except Exception as e:
             raise ValueError(f"Error extracting PDF: {str(e)}")
         
-        return text.strip()
+        return "\n".join(parts).strip()
+    
+    def _extract_from_pdf_pdfium(self, source: Union[str, BinaryIO]) -> str:
+        """
+        Extract text from PDF file with pypdfium2.
+        
+        pdfium is not thread-safe, so the in-process part holds _pdfium_lock;
+        long PDFs are read in the worker processes without it.
+        
+        Args:
+            source (Union[str, BinaryIO]): Path to PDF file or binary stream
+            
+        Returns:
+            str: Extracted text from all pages
+        """
+        with _pdfium_lock:
+            pdf = pdfium.PdfDocument(source)
+            
+            try:
+                num_pages = len(pdf)
+                if num_pages < PDF_PARALLEL_MIN_PAGES or PDF_MAX_WORKERS <= 1:
+                    # Release the native page resources as soon as each page is read
+                    return "\n".join(_pdfium_page_text(page) for page in pdf).strip()
+            finally:
+                pdf.close()
+        
+        parts = self._extract_pages_parallel(source, 'pdfium', num_pages)
+        return "\n".join(parts).strip()
     
-    def _extract_from_docx(self, file_path: str) -> str:
+    def _extract_pages_parallel(self, source: Union[str, BinaryIO], backend: str,
+                                num_pages: int) -> List[str]:
+        """
+        Extract the pages of a long PDF in the worker pool, one page range per worker.
+        
+        Args:
+            source (Union[str, BinaryIO]): Path to PDF file or binary stream
+            backend (str): 'pdfium' or 'pypdf2'
+            num_pages (int): Number of pages in the document
+            
+        Returns:
+            List[str]: Text of every page, in page order
+        """
+        if isinstance(source, str):
+            with open(source, 'rb') as f:
+                data = f.read()
+        else:
+            source.seek(0)
+            data = source.read()
+        
+        step = -(-num_pages // PDF_MAX_WORKERS)
+        pool = _get_pdf_pool()
+        futures = [
+            pool.submit(_extract_page_range, data, backend, start, min(start + step, num_pages))
+            for start in range(0, num_pages, step)
+        ]
+        return [text for future in futures for text in future.result()]
+    
+    def _extract_from_docx(self, source: Union[str, BinaryIO]) -> str:
         """
         Extract text from DOCX file.
         
+        Paragraphs and tables are read in one pass over the document body, in
+        document order.
+        
         Args:
-            file_path (str): Path to DOCX file
+            source (Union[str, BinaryIO]): Path to DOCX file or binary stream
             
         Returns:
             str: Extracted text from all paragraphs
         """
-        text = ""
+        lines = []
         
         try:
-            doc = Document(file_path)
-            
-            for paragraph in doc.paragraphs:
-                if paragraph.text.strip():
-                    text += paragraph.text + "\n"
+            doc = Document(source)
+            # Parent of top-level paragraphs and tables, as for doc.paragraphs
+            body = doc._body
             
-            # Also extract text from tables if present
-            for table in doc.tables:
-                for row in table.rows:
-                    for cell in row.cells:
-                        if cell.text.strip():
-                            text += cell.text + " "
-                    text += "\n"
+            for element in body._element.iterchildren():
+                if element.tag == _W_P:
+                    text = Paragraph(element, body).text
+                    if text.strip():
+                        lines.append(text)
+                
+                # Tables become one line per row
+                elif element.tag == _W_TBL:
+                    table = Table(element, body)
+                    for row in element.iterchildren(_W_TR):
+                        cells = (
+                            "\n".join(Paragraph(p, cell).text for p in cell._tc.iterchildren(_W_P))
+                            for cell in (_Cell(tc, table) for tc in row.iterchildren(_W_TC))
+                        )
+                        lines.append(" ".join(text for text in cells if text.strip()))
         
         except Exception as e:
             raise ValueError(f"Error extracting DOCX: {str(e)}")
         
-        return text.strip()
+        return "\n".join(lines).strip()
     
     def clean_text(self, text: str) -> str:
         """
@@ -101,11 +289,6 @@ class TextExtractor:
         Returns:
             str: Cleaned text
         """
-        # Remove multiple spaces
-        text = " ".join(text.split())
-        
-        # Normalize line breaks
-        lines = text.split("\n")
-        lines = [line.strip() for line in lines if line.strip()]
-        
-        return "\n".join(lines)
+        # Collapse all whitespace runs, line breaks included, to single spaces.
+        # This already leaves no lines to strip, so it is the only pass needed.
+        return " ".join(text.split())
@@ -0,0 +1,186 @@
+"""
+Behaviour tests for the FAISS index service.
+"""
+
+import json
+import os
+import time
+
+import faiss
+import numpy as np
+import pytest
+
+from services.faiss_index import FAISSIndex, IndexPersister, EMBEDDING_DIM
+
+
+def _vectors(n, seed=0):
+    """Random unit-length embeddings."""
+    vectors = np.random.default_rng(seed).standard_normal((n, EMBEDDING_DIM)).astype(np.float32)
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+
+def _metadatas(n, candidates=5):
+    """One metadata dict per vector, spread over a few candidates."""
+    return [
+        {'candidate_id': f"c{i % candidates}", 'chunk_type': 'skills', 'section': str(i), 'text': f"t{i}"}
+        for i in range(n)
+    ]
+
+
+def _wait_for_rebuild(faiss_index, timeout=30.0):
+    """Block until the background rebuild thread has finished."""
+    deadline = time.monotonic() + timeout
+    while faiss_index._rebuild_thread is not None:
+        assert time.monotonic() < deadline, "background rebuild did not finish"
+        time.sleep(0.02)
+
+
+def test_delete_from_memory_mapped_hnsw_index(tmp_path):
+    path = str(tmp_path / 'faiss.index')
+    vectors = _vectors(100)
+    writer = FAISSIndex(path, mmap=True, large_index_factory='')
+    writer.add_vectors(vectors, _metadatas(100))
+    writer.save()
+    writer.close()
+
+    # Reopened from disk, the index is a read-only view of the file
+    faiss_index = FAISSIndex(path, mmap=True, large_index_factory='')
+    assert faiss_index._read_only
+
+    assert faiss_index.delete_candidate('c1') == 20
+    assert all(
+        result['metadata']['candidate_id'] != 'c1'
+        for result in faiss_index.search(vectors[1], k=10)
+    )
+
+    _wait_for_rebuild(faiss_index)
+    assert faiss_index.index.ntotal == 80
+    assert len(faiss_index.metadata) == 80
+    assert faiss_index.search(vectors[2], k=1)[0]['metadata']['text'] == 't2'
+    assert os.path.exists(path)
+
+
+def test_second_process_cannot_write_the_same_index(tmp_path):
+    path = str(tmp_path / 'faiss.index')
+    writer = FAISSIndex(path, index_factory='Flat', large_index_factory='')
+    writer.add_vectors(_vectors(10), _metadatas(10))
+    writer.save()
+    
+    # A second instance opens its own lock file description, like another process
+    other = FAISSIndex(path, index_factory='Flat', large_index_factory='')
+    assert other.index.ntotal == 10
+    with pytest.raises(RuntimeError):
+        other.add_vectors(_vectors(1, seed=1), _metadatas(1))
+    
+    writer.close()
+    other.add_vectors(_vectors(1, seed=1), _metadatas(1))
+    assert other.index.ntotal == 11
+
+
+def test_add_save_reload(tmp_path):
+    path = str(tmp_path / 'faiss.index')
+    vectors = _vectors(30)
+    faiss_index = FAISSIndex(path, large_index_factory='')
+    faiss_index.add_vectors(vectors, _metadatas(30))
+    faiss_index.save()
+    faiss_index.close()
+    
+    reloaded = FAISSIndex(path, mmap=True, large_index_factory='')
+    assert reloaded.index.ntotal == 30
+    assert len(reloaded.metadata) == 30
+    assert reloaded.next_id == 30
+    hit = reloaded.search(vectors[7], k=1)[0]
+    assert hit['metadata']['text'] == 't7'
+    assert hit['metadata']['candidate_id'] == 'c2'
+    assert hit['score'] == pytest.approx(1.0, abs=1e-2)
+
+
+def test_wal_replays_rows_whose_vectors_were_saved(tmp_path):
+    path = str(tmp_path / 'faiss.index')
+    vectors = _vectors(15)
+    faiss_index = FAISSIndex(path, index_factory='Flat', large_index_factory='')
+    faiss_index.add_vectors(vectors[:10], _metadatas(10))
+    faiss_index.save()
+    
+    # The index file is rewritten but the metadata only reaches the log
+    faiss_index.add_vectors(vectors[10:13], _metadatas(13)[10:])
+    faiss_index.save()
+    # Never saved: the process dies before its vectors reach the index file
+    faiss_index.add_vectors(vectors[13:], _metadatas(15)[13:])
+    faiss_index.close()
+    
+    recovered = FAISSIndex(path, index_factory='Flat', large_index_factory='')
+    assert recovered.index.ntotal == 13
+    assert len(recovered.metadata) == 13
+    assert recovered.next_id == 13
+    assert recovered.search(vectors[12], k=1)[0]['metadata']['text'] == 't12'
+    
+    # The replayed log was folded into the metadata file
+    recovered.close()
+    assert os.path.getsize(recovered.wal_path) == 0
+    assert len(FAISSIndex(path, index_factory='Flat', large_index_factory='').metadata) == 13
+
+
+def test_legacy_json_metadata_and_l2_index_are_migrated(tmp_path):
+    path = str(tmp_path / 'faiss.index')
+    vectors = _vectors(10) * 3.0
+    legacy = faiss.IndexFlatL2(EMBEDDING_DIM)
+    legacy.add(vectors)
+    faiss.write_index(legacy, path)
+    with open(str(tmp_path / 'faiss_metadata.json'), 'w') as f:
+        json.dump({str(i): metadata for i, metadata in enumerate(_metadatas(10))}, f)
+    
+    faiss_index = FAISSIndex(path, index_factory='Flat', large_index_factory='')
+    assert faiss_index.index.metric_type == faiss.METRIC_INNER_PRODUCT
+    assert os.path.exists(faiss_index.metadata_path)
+    hit = faiss_index.search(vectors[4], k=1)[0]
+    assert hit['metadata']['text'] == 't4'
+    assert hit['score'] == pytest.approx(1.0, abs=1e-4)
+    faiss_index.close()
+    
+    # The second load reads the converted msgpack files
+    os.remove(str(tmp_path / 'faiss_metadata.json'))
+    reloaded = FAISSIndex(path, index_factory='Flat', large_index_factory='')
+    assert reloaded.index.metric_type == faiss.METRIC_INNER_PRODUCT
+    assert reloaded.get_metadata(4)['text'] == 't4'
+
+
+def test_ivf_rebuild_and_compaction(tmp_path):
+    path = str(tmp_path / 'faiss.index')
+    vectors = _vectors(400)
+    faiss_index = FAISSIndex(path, index_factory='Flat', large_index_factory='IVF4,Flat',
+                             large_index_size=300, nprobe=4)
+    faiss_index.add_vectors(vectors, _metadatas(400))
+    _wait_for_rebuild(faiss_index)
+    assert faiss_index.get_stats()['index_type'] == 'IndexIVFFlat'
+    
+    hits = faiss_index.search(vectors[3], k=5, candidate_id='c3')
+    assert hits[0]['metadata']['text'] == 't3'
+    assert all(hit['metadata']['candidate_id'] == 'c3' for hit in hits)
+    
+    assert faiss_index.delete_candidate('c0') == 80
+    _wait_for_rebuild(faiss_index)
+    assert faiss_index.index.ntotal == 320
+    assert faiss_index.get_stats()['pending_removals'] == 0
+    # IDs after the removed rows shifted down with their metadata
+    assert faiss_index.search(vectors[399], k=1)[0]['metadata']['text'] == 't399'
+    faiss_index.close()
+    
+    reloaded = FAISSIndex(path, index_factory='Flat', large_index_factory='IVF4,Flat',
+                          large_index_size=300, nprobe=4)
+    assert reloaded.index.ntotal == 320
+    assert reloaded.metadata.rows_for_candidate('c0').size == 0
+    assert reloaded.search(vectors[399], k=1)[0]['metadata']['text'] == 't399'
+
+
+def test_persister_flush_saves_pending_changes(tmp_path):
+    path = str(tmp_path / 'faiss.index')
+    faiss_index = FAISSIndex(path, index_factory='Flat', large_index_factory='')
+    persister = IndexPersister(faiss_index, interval=60.0)
+    
+    faiss_index.add_vectors(_vectors(5), _metadatas(5))
+    persister.mark_dirty()
+    persister.flush()
+    faiss_index.close()
+    
+    assert FAISSIndex(path, index_factory='Flat', large_index_factory='').index.ntotal == 5